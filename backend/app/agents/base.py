@@ -1,20 +1,30 @@
 from abc import ABC, abstractmethod
 from typing import Any, Dict
 from app.services.llm import LLMService
-from app.models.blackboard import Blackboard
+from app.models.blackboard import Blackboard, BlackboardPatch
+from langchain_core.messages import SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
 
 class BaseAgent(ABC):
+    # User message of the prompt, the only part rendered per call
+    user_prompt = ""
+
     def __init__(self):
         self.name = "Agent"
         self.description = "description"
 
-        self.llm = LLMService()
+        self.llm = LLMService(self)
 
-        self.state = None
+        # Only used to render the schema; per-request data is never stored
+        # on the agent because a single instance serves concurrent requests.
         self.blackboard = Blackboard()
-        self.prompt = ""
+        self._prompt_template = None
         
-    def get_prompt(self, state: Dict[str, Any]) -> str:
+    def get_prompt(self) -> str:
+        """
+        Return the system prompt. It must not depend on the request, so that its prefix is identical across calls
+        and cached by the provider; the blackboard and other request data go last, into the user message.
+        """
         return f"""
                     You are an agent named {self.name}.
 
@@ -23,16 +33,40 @@ class BaseAgent(ABC):
                     You are given a blackboard with a plan and a history.
 
                     You need to execute your task and update the blackboard plan and history.
-                    DO NOT FORGET TO UPDATE THE HISTORY. You need to update the history of the blackboard with only your({self.name}) actions.
-                    
-                    The blackboard is: {state.blackboard}
-
+                    DO NOT FORGET TO UPDATE THE HISTORY. You need to add only your({self.name}) actions to the history.
+                    Do not return the blackboard, return only your changes to it as a JSON patch.
                     """
 
+    def get_prompt_template(self) -> ChatPromptTemplate:
+        """
+        Return the prompt template of the agent, compiled on first use. The system prompt is a fixed message,
+        so only the variables of the user message are rendered per call.
+        """
+        if self._prompt_template is None:
+            self._prompt_template = ChatPromptTemplate([
+                SystemMessage(content=self.get_prompt()),
+                ("user", self.user_prompt),
+            ])
+        return self._prompt_template
+
+    def _build_result(self, patch: BlackboardPatch) -> Dict[str, Any]:
+        """
+        Return the node result with the patch of the blackboard.
+        The patch is not serialized, the engine needs to know which step fields the agent actually set.
+        """
+        return {"patch": patch}
+
     @abstractmethod
     def execute(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """
         Execute the given step and return the results.
         """
         pass
+
+    @abstractmethod
+    async def aexecute(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute the given step asynchronously and return the results.
+        """
+        pass
         
\ No newline at end of file
@@ -35,6 +35,12 @@ class CalendarAgent(EdgeAgent):
         self.name = "Calendar Agent"
         self.slug = "calendar"
         self.description = "Responsible for getting the calendar information from the Google Calendar API."
+        # Tools without side effects
+        self.read_only_tools = {"get_today_events", "get_upcoming_events", "check_availability"}
+        # Seconds a cached tool result stays fresh
+        self.tool_ttls = {"get_today_events": 60, "get_upcoming_events": 60, "check_availability": 60}
+        # Cached results made stale by the actions
+        self.tool_invalidations = {"add_event": ["get_today_events", "get_upcoming_events", "check_availability"]}
         
         # Mock function tools for calendar operations
         self.tools = [
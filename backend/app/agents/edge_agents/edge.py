@@ -1,12 +1,31 @@
 from app.agents.base import BaseAgent
-from typing import Dict, Any
-from app.services.llm import LLMService
-from app.models.blackboard import Blackboard, Status
-import json
-from langchain_core.prompts import ChatPromptTemplate
+from typing import Dict, Any, List
+from app.models.blackboard import BlackboardPatch, Status, Step, StepUpdate
+from app.services.prefetch import get_prefetch_cache
+from app.services.tool_cache import get_tool_result_cache
+from app.services.single_flight import get_single_flight
+from app.core.config import cfg
+from langchain_core.tools import BaseTool
+from pydantic import BaseModel
 from loguru import logger
+import asyncio
+
+# JSON schema types accepted for direct tool calls
+JSON_SCHEMA_TYPES = {
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "object": dict,
+    "array": list,
+}
 
 class EdgeAgent(BaseAgent):
+    user_prompt = '''
+        Pending actions: {pending_actions}
+        The blackboard is: {blackboard}
+        '''
+
     def __init__(self):
         super().__init__()
 
@@ -14,15 +33,15 @@ class EdgeAgent(BaseAgent):
         self.slug = "edge"
         self.description = "Edge Agent is responsible for checking the status of the edge devices."
 
-        self.llm = LLMService()
-
-        self.state = None
-        self.blackboard = Blackboard()
-        self.prompt = ""
-
         self.tools = []
+        self.read_only_tools = set()
+        # Seconds the result of a read tool stays fresh, tools without a TTL are never cached
+        self.tool_ttls = {}
+        # Read tools whose cached results an action makes stale
+        self.tool_invalidations = {}
+        self._result_cached_tools = None
         
-    def get_prompt(self, state: Dict[str, Any]) -> str:
+    def get_prompt(self) -> str:
         return f"""
                     You are an edge agent named {self.name}. 
                     An edge agent is responsible for checking the status of the edge devices or APIs and running the corresponding actions.
@@ -31,53 +50,238 @@ class EdgeAgent(BaseAgent):
 
                     Your description is: {self.description}
 
-                    You are given a blackboard with a plan and a history.
+                    You are given a blackboard with a plan and a history, and the pending actions requested by the user.
 
                     You need to execute your task and update the blackboard plan and history.
-                    DO NOT FORGET TO UPDATE THE HISTORY. You need to update the history of the blackboard with only your({self.name}) actions.
+                    DO NOT FORGET TO UPDATE THE HISTORY. You need to add only your({self.name}) actions to the history.
                     Add the result of the action to the description of the corresponding entry in the history.
-                    
-                    The blackboard is: {state.blackboard}
 
-                    See the requested pending actions from user input.
-                    Use the tools to execute the actions.
-                    Update the blackboard plan and history with the results of the actions.
-                    DO NOT RETURN ANYTHING ELSE. ONLY RETURN THE UPDATED BLACKBOARD JSON.
+                    Use the tools to execute the pending actions.
+                    Set the status of the plan steps you executed with update_steps and add one history entry per action with add_history.
+                    Do not add plan steps, the orchestration agent takes care of the plan.
+                    DO NOT RETURN ANYTHING ELSE. ONLY RETURN THE JSON PATCH OF THE BLACKBOARD, NOT THE BLACKBOARD ITSELF.
 
-                    You need to return the blackboard as JSON with the following format:
-                        {str(self.blackboard.get_schema())}
+                    You need to return the patch as JSON with the following format:
+                        {str(BlackboardPatch.get_schema())}
                     """
 
-    def execute(self, state: Dict[str, Any]) -> Dict[str, Any]:
+    def get_tool_args_schema(self, tool: BaseTool) -> Dict[str, Any]:
         """
-        Execute the given step and return the results.
+        Return the JSON schema of the tool arguments.
+        """
+        args_schema = tool.args_schema
+        if isinstance(args_schema, dict):
+            return args_schema
+        if isinstance(args_schema, type) and issubclass(args_schema, BaseModel):
+            return args_schema.model_json_schema()
+        return {"type": "object", "properties": {}, "required": []}
+
+    def get_tool_specs(self) -> List[Dict[str, Any]]:
+        """
+        Describe the tools of the agent so that plans can reference them directly.
+        """
+        return [
+            {
+                "name": tool.name,
+                "description": tool.description,
+                "args": self.get_tool_args_schema(tool).get("properties", {}),
+            }
+            for tool in self.tools
+        ]
+
+    def get_result_cached_tools(self) -> List[BaseTool]:
+        """
+        Return the tools wrapped by the tool result cache, with identical concurrent calls of read tools coalesced under it.
+        """
+        if self._result_cached_tools is None:
+            tools = self.tools
+            single_flight = get_single_flight()
+            if single_flight is not None:
+                tools = [single_flight.wrap(tool) if tool.name in self.read_only_tools else tool for tool in tools]
+            if cfg.TOOL_RESULT_CACHE:
+                tool_result_cache = get_tool_result_cache()
+                tools = [
+                    tool_result_cache.wrap(tool, self.tool_ttls.get(tool.name), self.tool_invalidations.get(tool.name, []))
+                    for tool in tools
+                ]
+            self._result_cached_tools = tools
+        return self._result_cached_tools
+
+    def get_tools(self, state: Dict[str, Any]) -> List[BaseTool]:
+        """
+        Return the tools to use for a request, answering from its prefetched results when there are any.
+        Actions drop the prefetched results they make stale.
+        """
+        tools = self.get_result_cached_tools()
+        prefetch_cache = get_prefetch_cache(state.request_id)
+        if prefetch_cache is None:
+            return tools
+        return [
+            prefetch_cache.wrap(tool) if tool.name in self.read_only_tools
+            else prefetch_cache.wrap_action(tool, self.tool_invalidations[tool.name]) if tool.name in self.tool_invalidations
+            else tool
+            for tool in tools
+        ]
+
+    def get_validated_tool(self, tool_name: str, args: Dict[str, Any], tools: List[BaseTool] = None) -> BaseTool:
+        """
+        Return the tool if the arguments match its args_schema, raise ValueError otherwise.
+        """
+        tools_dict = {tool.name: tool for tool in (tools if tools is not None else self.tools)}
+        if tool_name not in tools_dict:
+            raise ValueError(f"{self.name} has no tool named {tool_name}")
+
+        tool = tools_dict[tool_name]
+        args_schema = self.get_tool_args_schema(tool)
+        properties = args_schema.get("properties", {})
+
+        missing_args = [arg for arg in args_schema.get("required", []) if arg not in args]
+        if missing_args:
+            raise ValueError(f"Missing arguments for {tool_name}: {missing_args}")
+
+        unknown_args = [arg for arg in args if arg not in properties]
+        if unknown_args:
+            raise ValueError(f"Unknown arguments for {tool_name}: {unknown_args}")
+
+        for arg, value in args.items():
+            expected_type = JSON_SCHEMA_TYPES.get(properties[arg].get("type"))
+            # bool is a subclass of int, it is only accepted for boolean arguments
+            if expected_type is not None and (
+                not isinstance(value, expected_type)
+                or (isinstance(value, bool) and properties[arg].get("type") != "boolean")
+            ):
+                raise ValueError(f"Invalid type for argument {arg} of {tool_name}: {type(value).__name__}")
+
+        return tool
+
+    def _get_direct_steps(self, steps: List[Step], tools: List[BaseTool]):
+        """
+        Split the steps into the ones that can be dispatched directly to a tool and the ones that need the LLM.
+        """
+        direct_steps = []
+        llm_steps = []
+        for step in steps:
+            if step.tool is None:
+                llm_steps.append(step)
+                continue
+            try:
+                direct_steps.append((step, self.get_validated_tool(step.tool, step.args, tools)))
+            except ValueError as e:
+                logger.warning(f"Step {step.id} can not be dispatched directly, falling back to the LLM: {e}")
+                llm_steps.append(step)
+
+        return direct_steps, llm_steps
+
+    def _complete_direct_step(self, patch: BlackboardPatch, step: Step, response: Any = None, error: Exception = None):
+        """
+        Record the result of a directly dispatched tool call in the patch.
+        """
+        status = Status.FAILED if error is not None else Status.COMPLETED
+        result = f"Error: {error}" if error is not None else response
+        patch.update_steps.append(StepUpdate(id=step.id, status=status))
+        patch.add_history.append(Step(
+            agent=step.agent,
+            description=f"{step.description} {step.tool}({', '.join(f'{k}={v}' for k, v in step.args.items())}): {result}",
+            status=status,
+            tool=step.tool,
+            args=step.args,
+        ))
+
+    def _dispatch_direct_steps(self, steps: List[Step], tools: List[BaseTool]):
+        """
+        Call the tools of the fully specified steps without the LLM and return their patch and the remaining steps.
+        """
+        patch = BlackboardPatch()
+        direct_steps, llm_steps = self._get_direct_steps(steps, tools)
+        for step, tool in direct_steps:
+            logger.info(f"Dispatching step {step.id} directly to {step.tool}")
+            try:
+                self._complete_direct_step(patch, step, response=tool.invoke(step.args))
+            except Exception as e:
+                logger.error(f"Direct tool call {step.tool} failed: {e}")
+                self._complete_direct_step(patch, step, error=e)
+
+        return patch, llm_steps
+
+    async def _adispatch_direct_steps(self, steps: List[Step], tools: List[BaseTool]):
         """
-        self.state = state
-        self.blackboard = state.blackboard
-        self.prompt = self.get_prompt(state)
+        Call the tools of the fully specified steps concurrently without the LLM and return their patch and the remaining steps.
+        """
+        patch = BlackboardPatch()
+        direct_steps, llm_steps = self._get_direct_steps(steps, tools)
+        if len(direct_steps) == 0:
+            return patch, llm_steps
+
+        responses = await asyncio.gather(
+            *[tool.ainvoke(step.args) for step, tool in direct_steps],
+            return_exceptions=True
+        )
+        for (step, _), response in zip(direct_steps, responses):
+            logger.info(f"Dispatched step {step.id} directly to {step.tool}")
+            if isinstance(response, Exception):
+                logger.error(f"Direct tool call {step.tool} failed: {response}")
+                self._complete_direct_step(patch, step, error=response)
+            else:
+                self._complete_direct_step(patch, step, response=response)
+
+        return patch, llm_steps
+
+    def _get_pending_actions(self, state: Dict[str, Any], steps: List[Step] = None):
+        # The scheduler passes the steps that are ready to run, otherwise take every pending step
+        if steps is not None:
+            return steps
 
         # Get pending edge actions from the blackboard
-        pending_actions = [step for step in self.blackboard.plan.steps if step.status == Status.PENDING and step.agent == self.slug]
+        return [step for step in state.blackboard.plan.steps if step.status == Status.PENDING and step.agent == self.slug]
+
+    def execute(self, state: Dict[str, Any], steps: List[Step] = None) -> Dict[str, Any]:
+        """
+        Execute the given step and return the results.
+        """
+        pending_actions = self._get_pending_actions(state, steps)
 
         if len(pending_actions) == 0:
             logger.info(f"No pending actions for {self.name}")
             return None
 
-        user_prompt = '''
-        Pending actions: {pending_actions}
-        '''
+        # Fully specified steps are run without the LLM
+        tools = self.get_tools(state)
+        patch, pending_actions = self._dispatch_direct_steps(pending_actions, tools)
+        if len(pending_actions) == 0:
+            return self._build_result(patch)
+        if not patch.is_empty():
+            # The LLM sees the results of the direct tool calls
+            state = state.model_copy(update={"blackboard": state.blackboard.apply_patch(patch)})
 
-        messages = [
-            ("system", self.prompt),
-            ("user", user_prompt),
-        ]
+        prompt = self.get_prompt_template()
+        response = self.llm.invoke(prompt, is_response_json=True, tools=tools, read_only_tools=self.read_only_tools,
+                                   input={"pending_actions": pending_actions, "blackboard": str(state.blackboard)})
 
-        prompt = ChatPromptTemplate(messages)
-        response = self.llm.invoke(prompt, is_response_json=True, tools=self.tools,
-                                   input={"pending_actions": pending_actions})
+        patch.extend(state.blackboard.parse_patch(response))
+        return self._build_result(patch)
 
-        self.blackboard = Blackboard(**response)
-        blackboard_dict = json.loads(self.blackboard.model_dump_json())
-        
-        return {"blackboard": blackboard_dict}
-        
\ No newline at end of file
+    async def aexecute(self, state: Dict[str, Any], steps: List[Step] = None) -> Dict[str, Any]:
+        """
+        Execute the given step asynchronously and return the results.
+        """
+        pending_actions = self._get_pending_actions(state, steps)
+
+        if len(pending_actions) == 0:
+            logger.info(f"No pending actions for {self.name}")
+            return None
+
+        # Fully specified steps are run without the LLM
+        tools = self.get_tools(state)
+        patch, pending_actions = await self._adispatch_direct_steps(pending_actions, tools)
+        if len(pending_actions) == 0:
+            return self._build_result(patch)
+        if not patch.is_empty():
+            # The LLM sees the results of the direct tool calls
+            state = state.model_copy(update={"blackboard": state.blackboard.apply_patch(patch)})
+
+        prompt = self.get_prompt_template()
+        response = await self.llm.ainvoke(prompt, is_response_json=True, tools=tools, read_only_tools=self.read_only_tools,
+                                          input={"pending_actions": pending_actions, "blackboard": str(state.blackboard)})
+
+        patch.extend(state.blackboard.parse_patch(response))
+        return self._build_result(patch)
@@ -35,6 +35,15 @@ class EmailAgent(EdgeAgent):
         self.name = "Email Agent"
         self.slug = "email"
         self.description = "Responsible for getting the email information from the email IoT device."
+        # Tools without side effects
+        self.read_only_tools = {"get_unread_emails", "search_emails"}
+        # Seconds a cached tool result stays fresh
+        self.tool_ttls = {"get_unread_emails": 30, "search_emails": 30}
+        # Cached results made stale by the actions
+        self.tool_invalidations = {
+            "send_email": ["search_emails"],
+            "mark_email_as_read": ["get_unread_emails", "search_emails"],
+        }
         
         # Mock function tools for email operations
         self.tools = [
@@ -65,6 +65,10 @@ class EmergencyAgent(EdgeAgent):
         self.name = "Emergency Agent"
         self.slug = "emergency"
         self.description = "Responsible for handling emergency situations, calling emergency services, and managing emergency contacts."
+        # Tools without side effects
+        self.read_only_tools = {"get_emergency_contacts", "check_emergency_status"}
+        # Seconds a cached tool result stays fresh
+        self.tool_ttls = {"get_emergency_contacts": 300}
         
         # Mock function tools for emergency operations
         self.tools = [
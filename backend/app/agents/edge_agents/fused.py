@@ -0,0 +1,31 @@
+from app.agents.edge_agents.edge import EdgeAgent
+from typing import List
+
+
+class FusedEdgeAgent(EdgeAgent):
+    """
+    Acts for several edge agents at once, so all of their pending steps are resolved in a single tool-calling turn.
+    """
+    def __init__(self, agents: List[EdgeAgent]):
+        super().__init__()
+        self.name = "Fused Edge Agent"
+        self.slug = "fused"
+        self.agents = agents
+
+        agent_descriptions = "\n".join(
+            f"                    - {agent.name} ({agent.slug}): {agent.description}" for agent in agents
+        )
+        self.description = f"""You act on behalf of the following edge agents at once:
+{agent_descriptions}
+                    Execute the pending actions of all of them, using the tools of each agent.
+                    Record every action in the history under the agent name of the step it belongs to."""
+
+        # Union of the agents' tools, tool names are unique across agents
+        tools_dict = {}
+        for agent in agents:
+            for tool in agent.tools:
+                tools_dict.setdefault(tool.name, tool)
+        self.tools = list(tools_dict.values())
+        self.read_only_tools = set().union(*[agent.read_only_tools for agent in agents])
+        self.tool_ttls = {name: ttl for agent in agents for name, ttl in agent.tool_ttls.items()}
+        self.tool_invalidations = {name: tools for agent in agents for name, tools in agent.tool_invalidations.items()}
@@ -28,6 +28,15 @@ class LightAgent(EdgeAgent):
         self.name = "Light Agent"
         self.slug = "light"
         self.description = "Responsible for getting the light status from the light IoT device."
+        # Tools without side effects
+        self.read_only_tools = {"check_light_status", "get_all_lights_status"}
+        # Seconds a cached tool result stays fresh
+        self.tool_ttls = {"check_light_status": 5, "get_all_lights_status": 5}
+        # Cached results made stale by the actions
+        self.tool_invalidations = {
+            "turn_light_on": ["check_light_status", "get_all_lights_status"],
+            "turn_light_off": ["check_light_status", "get_all_lights_status"],
+        }
         
         # Mock function tools for light operations
         self.tools = [
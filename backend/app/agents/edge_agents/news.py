@@ -34,6 +34,10 @@ class NewsAgent(EdgeAgent):
         self.name = "News Agent"
         self.slug = "news"
         self.description = "Responsible for getting the news information from the news API."
+        # Tools without side effects
+        self.read_only_tools = {"get_top_headlines", "get_news_by_category", "search_news"}
+        # Seconds a cached tool result stays fresh
+        self.tool_ttls = {"get_top_headlines": 900, "get_news_by_category": 900, "search_news": 900}
         
         # Mock function tools for news operations
         self.tools = [
@@ -4,19 +4,24 @@ from typing import Dict, Any
 from langchain_core.tools import StructuredTool
 
 from loguru import logger
-import requests
+
+from app.services.device_twin import TEMPERATURE_DEVICE, HUMIDITY_DEVICE, read_device, aread_device
 
 def get_room_temperatures() -> Dict[str, Any]:
     logger.info("Getting room temperatures from IOT API")
-    # https://sensors.davidoglu.vip/api/v1/iot-1/temperature
-    response = requests.get("https://sensors.davidoglu.vip/api/v1/iot-1/temperature")
-    return response.json()
+    return read_device(TEMPERATURE_DEVICE)
+
+async def aget_room_temperatures() -> Dict[str, Any]:
+    logger.info("Getting room temperatures from IOT API")
+    return await aread_device(TEMPERATURE_DEVICE)
 
 def get_room_humidity() -> Dict[str, Any]:
     logger.info("Getting room humidity")
-    # https://sensors.davidoglu.vip/api/v1/iot-1/humidity
-    response = requests.get("https://sensors.davidoglu.vip/api/v1/iot-1/humidity")
-    return response.json()
+    return read_device(HUMIDITY_DEVICE)
+
+async def aget_room_humidity() -> Dict[str, Any]:
+    logger.info("Getting room humidity")
+    return await aread_device(HUMIDITY_DEVICE)
 
 class RoomTemperatureAgent(EdgeAgent):
     def __init__(self):
@@ -24,6 +29,10 @@ class RoomTemperatureAgent(EdgeAgent):
         self.name = "Room Temperature Agent"
         self.slug = "room_temperature"
         self.description = "Responsible for getting and controlling room temperatures from the HVAC IoT system."
+        # Tools without side effects
+        self.read_only_tools = {"get_room_temperatures", "get_room_humidity"}
+        # Seconds a cached tool result stays fresh
+        self.tool_ttls = {"get_room_temperatures": 10, "get_room_humidity": 10}
         
         # Mock function tools for room temperature operations
         self.tools = [
@@ -31,6 +40,7 @@ class RoomTemperatureAgent(EdgeAgent):
                 name="get_room_temperatures",
                 description="Get temperatures for all rooms",
                 func=get_room_temperatures,
+                coroutine=aget_room_temperatures,
                 args_schema={
                     "type": "object",
                     "properties": {},
@@ -41,6 +51,7 @@ class RoomTemperatureAgent(EdgeAgent):
                 name="get_room_humidity",
                 description="Get humidity for all rooms",
                 func=get_room_humidity,
+                coroutine=aget_room_humidity,
                 args_schema={
                     "type": "object",
                     "properties": {},
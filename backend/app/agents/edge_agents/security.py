@@ -5,12 +5,9 @@ from langchain_core.tools import StructuredTool
 
 from loguru import logger
 
-import requests
+from app.services.device_twin import OCCUPANCY_DEVICE, HEADING_DEVICE, read_device, aread_device
 
-def check_occupancy() -> Dict[str, Any]:
-    logger.info("Checking occupancy and stranger movements")
-    response = requests.get("https://sensors.davidoglu.vip/api/v1/iot-2/occupancy")
-    response = response.json()
+def _parse_occupancy(response: Dict[str, Any]) -> Dict[str, Any]:
     if response.get("status") == "success":
         occupancy = True if response.get("message") == 1 else False
         logger.info("Occupancy checked successfully")
@@ -21,10 +18,8 @@ def check_occupancy() -> Dict[str, Any]:
         "occupancy": occupancy
     }
 
-def check_safe_box_door_status() -> Dict[str, Any]:
-    logger.info("Checking safe box door status")
-    response = requests.get("https://sensors.davidoglu.vip/api/v1/iot-2/heading")
-    response = response.json()
+def _parse_safe_box_door_status(response: Dict[str, Any]) -> Dict[str, Any]:
+    safe_box_door_status = None
     if response.get("status") == "success":
         heading = response.get("message")
         # if heading in in range of 0-180, it is open, close otherwise
@@ -34,13 +29,27 @@ def check_safe_box_door_status() -> Dict[str, Any]:
             else:
                 safe_box_door_status = "close"
         logger.info("Heading checked successfully")
-    else:
-        safe_box_door_status = None
     return {
         "status": "success",
         "safe_box_door_status": safe_box_door_status
     }
 
+def check_occupancy() -> Dict[str, Any]:
+    logger.info("Checking occupancy and stranger movements")
+    return _parse_occupancy(read_device(OCCUPANCY_DEVICE))
+
+async def acheck_occupancy() -> Dict[str, Any]:
+    logger.info("Checking occupancy and stranger movements")
+    return _parse_occupancy(await aread_device(OCCUPANCY_DEVICE))
+
+def check_safe_box_door_status() -> Dict[str, Any]:
+    logger.info("Checking safe box door status")
+    return _parse_safe_box_door_status(read_device(HEADING_DEVICE))
+
+async def acheck_safe_box_door_status() -> Dict[str, Any]:
+    logger.info("Checking safe box door status")
+    return _parse_safe_box_door_status(await aread_device(HEADING_DEVICE))
+
 
 class SecurityAgent(EdgeAgent):
     def __init__(self):
@@ -48,6 +57,8 @@ class SecurityAgent(EdgeAgent):
         self.name = "Security Agent"
         self.slug = "security"
         self.description = "Responsible for monitoring home security, checking occupancy, detecting stranger movements, and managing security systems."
+        # Tools without side effects
+        self.read_only_tools = {"check_occupancy"}
         
         # Mock function tools for security operations
         self.tools = [
@@ -55,6 +66,7 @@ class SecurityAgent(EdgeAgent):
                 name="check_occupancy",
                 description="Check occupancy and detect stranger movements",
                 func=check_occupancy,
+                coroutine=acheck_occupancy,
                 args_schema={
                     "type": "object",
                     "properties": {},
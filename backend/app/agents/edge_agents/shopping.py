@@ -51,6 +51,20 @@ class ShoppingAgent(EdgeAgent):
         self.name = "Shopping Agent"
         self.slug = "shopping"
         self.description = "Responsible for shopping for groceries and other items from the shopping API."
+        # Tools without side effects
+        self.read_only_tools = {"search_products", "get_shopping_history", "get_current_offers", "get_shopping_list"}
+        # Seconds a cached tool result stays fresh
+        self.tool_ttls = {
+            "search_products": 300,
+            "get_current_offers": 900,
+            "get_shopping_history": 60,
+            "get_shopping_list": 60,
+        }
+        # Cached results made stale by the actions
+        self.tool_invalidations = {
+            "add_to_cart": ["get_shopping_list"],
+            "checkout": ["get_shopping_history", "get_shopping_list"],
+        }
         
         # Mock function tools for shopping operations
         self.tools = [
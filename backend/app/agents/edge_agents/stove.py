@@ -35,6 +35,14 @@ class StoveAgent(EdgeAgent):
         self.name = "Stove Agent"
         self.slug = "stove"
         self.description = "Responsible for getting the stove status from the stove IoT device."
+        # Tools without side effects
+        self.read_only_tools = {"check_stove_status", "get_stove_temperature", "get_cooking_timer", "get_all_stoves_status"}
+        # Seconds a cached tool result stays fresh
+        self.tool_ttls = {"check_stove_status": 5, "get_stove_temperature": 5, "get_all_stoves_status": 5}
+        # Cached results made stale by the actions
+        self.tool_invalidations = {
+            "turn_stove_off": ["check_stove_status", "get_stove_temperature", "get_all_stoves_status"],
+        }
         
         # Mock function tools for stove operations
         self.tools = [
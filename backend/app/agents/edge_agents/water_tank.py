@@ -32,6 +32,15 @@ class WaterTankAgent(EdgeAgent):
         self.name = "Water Tank Agent"
         self.slug = "water_tank"
         self.description = "Responsible for getting the water level from the water tank IoT device."
+        # Tools without side effects
+        self.read_only_tools = {"check_water_level", "get_water_usage", "check_water_quality", "get_tank_status"}
+        # Seconds a cached tool result stays fresh
+        self.tool_ttls = {
+            "check_water_level": 10,
+            "get_tank_status": 10,
+            "get_water_usage": 60,
+            "check_water_quality": 60,
+        }
         
         # Mock function tools for water tank operations
         self.tools = [
@@ -39,6 +39,10 @@ class WeatherAgent(EdgeAgent):
         self.name = "Weather Agent"
         self.slug = "weather"
         self.description = "Responsible for getting the weather information from the weather API."
+        # Tools without side effects
+        self.read_only_tools = {"get_current_weather", "get_weather_forecast", "get_weather_alerts"}
+        # Seconds a cached tool result stays fresh
+        self.tool_ttls = {"get_current_weather": 300, "get_weather_forecast": 900, "get_weather_alerts": 300}
         
         # Mock function tools for weather operations
         self.tools = [
@@ -28,6 +28,15 @@ class WindowAgent(EdgeAgent):
         self.name = "Window Agent"
         self.slug = "window"
         self.description = "Responsible for getting the windows status from the window IoT device."
+        # Tools without side effects
+        self.read_only_tools = {"check_window_status", "get_all_windows_status"}
+        # Seconds a cached tool result stays fresh
+        self.tool_ttls = {"check_window_status": 5, "get_all_windows_status": 5}
+        # Cached results made stale by the actions
+        self.tool_invalidations = {
+            "close_window": ["check_window_status", "get_all_windows_status"],
+            "open_window": ["check_window_status", "get_all_windows_status"],
+        }
         
         # Mock function tools for window operations
         self.tools = [
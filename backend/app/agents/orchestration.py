@@ -1,12 +1,16 @@
 from app.agents.base import BaseAgent
 from app.models.state import State
-from app.models.blackboard import Blackboard
-from typing import Dict, Any
-from langchain_core.prompts import ChatPromptTemplate
-import json
+from app.models.blackboard import Blackboard, BlackboardPatch, Status
+from typing import Dict, Any, Callable, Optional
 
 
 class OrchestrationAgent(BaseAgent):
+    user_prompt = '''
+        List of agents: {agents}
+        User request: {request}
+        The blackboard is: {blackboard}
+        '''
+
     def __init__(self):
         super().__init__()
 
@@ -42,6 +46,14 @@ Your responsibilities:
   3. If the condition is met AND action is needed, plan the appropriate action steps
   4. Only mark as completed after all conditional actions have been executed
 
+**DEPENDENCIES AND CONDITIONS**:
+- Every plan step has an id and a depends_on list with the ids of the steps it waits for. Steps whose dependencies are completed are run without asking you, so order new steps with depends_on instead of adding them one round at a time.
+- Steps with a condition wait for your decision. Once their dependencies are completed, decide the condition from the history:
+  1. If the condition holds, set its condition to null in update_steps so the step runs.
+  2. If it does not hold, set the step status to 'completed' and say in its description that it was skipped and why.
+- Never change the id of an existing step.
+- If a new step is fully performed by exactly one tool of its agent with known arguments, set tool and args from the agent's tools so it runs without an extra agent round.
+
 **DECISION MAKING PROCESS**:
 - After each agent completes, ask yourself: "Based on these results, what actions does the user's request require?"
 - Do NOT assume actions are complete just because you've gathered information
@@ -90,41 +102,70 @@ Expected orchestration description:
 ### Important:
 
 - Invoke only the agents necessary for the next actions.
-- Always return the updated blackboard as valid JSON with the plan and history updated accordingly.
-- **DO NOT MODIFY THE PROVIDED HISTORY. ONLY ADD NEW STEPS TO THE HISTORY.**
+- Always return your changes to the blackboard as a valid JSON patch: status changes of existing plan steps in update_steps, new plan steps in add_steps and new history entries in add_history.
+- **DO NOT REPEAT THE PROVIDED HISTORY. ONLY ADD NEW STEPS TO THE HISTORY.**
 - Use a friendly, helpful, and conversational tone in the final summary so the user feels like they're talking to a smart assistant who understands and cares.
 - Set the final orchestration step's status to 'completed' when the plan is done.
 
 ---
 
-Return the blackboard as JSON with the following format:
+Return the patch as JSON with the following format, always in this field order:
 
-{str(self.blackboard.get_schema())}
+{str(BlackboardPatch.get_schema())}
 """
 
 
 
 
-    def execute(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        self.state = state
-        self.blackboard = state.blackboard
-        self.prompt = self.get_prompt(state)
-
-        user_prompt = '''
-        List of agents: {agents}
-        User request: {request}
-        '''
-
-        messages = [
-            ("system", self.prompt),
-            ("user", user_prompt),
-        ]
-
-        prompt = ChatPromptTemplate(messages)
-        response = self.llm.invoke(prompt, is_response_json=True,
-                                   input={"agents": state.agents, "request": state.request})
-
-        self.blackboard = Blackboard(**response)
-        blackboard_dict = json.loads(self.blackboard.model_dump_json())
-        
-        return {"blackboard": blackboard_dict}
+    def _get_summary(self, state: Dict[str, Any], partial: Dict[str, Any]) -> Optional[str]:
+        """
+        Return the final summary from a partially generated patch, or None if the response is not final.
+        The plan changes are generated before the history, so they are complete once the new history steps are streamed.
+        """
+        statuses = {step.id: step.status for step in state.blackboard.plan.steps}
+        for step_update in partial.get("update_steps") or []:
+            if isinstance(step_update, dict) and step_update.get("id") in statuses and "status" in step_update:
+                statuses[step_update["id"]] = step_update["status"]
+        added_statuses = [step.get("status") if isinstance(step, dict) else None for step in partial.get("add_steps") or []]
+        if not all(status == Status.COMPLETED for status in [*statuses.values(), *added_statuses]):
+            return None
+
+        for step in reversed(partial.get("add_history") or []):
+            if isinstance(step, dict) and "orchestration" in str(step.get("agent", "")).lower():
+                if step.get("status") not in (None, Status.COMPLETED):
+                    return None
+                return step.get("description") or None
+        return None
+
+    def _get_summary_handler(self, state: Dict[str, Any], on_summary: Callable[[str], None]) -> Callable[[Dict[str, Any]], None]:
+        """Build the partial response handler that calls on_summary whenever the final summary grows"""
+        last_summary = ""
+
+        def on_partial(partial: Dict[str, Any]):
+            nonlocal last_summary
+            summary = self._get_summary(state, partial)
+            if summary and summary != last_summary:
+                last_summary = summary
+                on_summary(summary)
+
+        return on_partial
+
+    def execute(self, state: Dict[str, Any], on_summary: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        prompt = self.get_prompt_template()
+        input = {"agents": state.agents, "request": state.request, "blackboard": str(state.blackboard)}
+        if on_summary is None:
+            response = self.llm.invoke(prompt, is_response_json=True, input=input)
+        else:
+            response = self.llm.stream(prompt, self._get_summary_handler(state, on_summary), input=input)
+
+        return self._build_result(state.blackboard.parse_patch(response))
+
+    async def aexecute(self, state: Dict[str, Any], on_summary: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        prompt = self.get_prompt_template()
+        input = {"agents": state.agents, "request": state.request, "blackboard": str(state.blackboard)}
+        if on_summary is None:
+            response = await self.llm.ainvoke(prompt, is_response_json=True, input=input)
+        else:
+            response = await self.llm.astream(prompt, self._get_summary_handler(state, on_summary), input=input)
+
+        return self._build_result(state.blackboard.parse_patch(response))
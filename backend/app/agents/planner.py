@@ -1,13 +1,17 @@
 from app.agents.base import BaseAgent
 from app.models.state import State
-from app.models.blackboard import Blackboard
+from app.models.blackboard import Blackboard, BlackboardPatch
 from typing import Dict, Any
-from langchain_core.prompts import ChatPromptTemplate
-import json
 from loguru import logger
 
 
 class PlannerAgent(BaseAgent):
+    user_prompt = '''
+        List of agents: {agents}
+        User request: {request}
+        The blackboard is: {blackboard}
+        '''
+
     def __init__(self):
         super().__init__()
 
@@ -27,12 +31,15 @@ class PlannerAgent(BaseAgent):
         5. For other tasks requiring specialized processing or multi-step workflows, invoke the relevant agents accordingly.
         6. If the request is from an IoT device (explicitly stated), create a specialized flow addressing the device context (e.g., "Weather API: Rainy this evening" → check windows, send alerts).
         7. Maintain a detailed plan history on the blackboard, explaining your purpose for invoking each agent and your reasoning.
+        8. Give every plan step a short unique id and list in depends_on the ids of the steps whose results it needs. Steps without dependencies run in parallel, so only add a dependency when a step really needs the result of another one.
+        9. If a step must only run when a condition on earlier results holds (e.g. "close the windows if it rains"), write that condition into its condition field and make it depend on the steps that gather the information. Leave condition null for all other steps.
+        10. If a step is fully performed by exactly one tool of its agent and you know all of its arguments (e.g. "get_all_windows_status"), set tool to the tool name and args to its arguments, exactly as listed in the agent's tools. Leave tool null whenever the step needs judgement or several tool calls.
 
         Important:
         - Invoke ONLY the agents absolutely necessary to fulfill the request.
         - Avoid invoking News or Search agents unnecessarily for simple factual questions.
-        - Return the updated blackboard as JSON, following this schema:
-            {str(self.blackboard.get_schema())}
+        - Do not return the blackboard. Return only your changes to it as a JSON patch, adding the plan steps with add_steps and your reasoning with add_history, following this schema:
+            {str(BlackboardPatch.get_schema())}
 
         Examples:
 
@@ -45,32 +52,24 @@ class PlannerAgent(BaseAgent):
         - User request: "Search online for today's weather forecast."
         → Invoke Search or Weather agent as needed.
 
-        Your response must strictly follow the above instructions and return the blackboard JSON.
+        Your response must strictly follow the above instructions and return the JSON patch.
 
         """
 
     def execute(self, state: Dict[str, Any]) -> Dict[str, Any]:
         logger.info(f"Executing Planner Agent")
 
-        self.state = state
-        self.blackboard = state.blackboard
-        self.prompt = self.get_prompt(state)
+        prompt = self.get_prompt_template()
+        response = self.llm.invoke(prompt, is_response_json=True,
+                                   input={"agents": state.agents, "request": state.request, "blackboard": str(state.blackboard)})
 
-        user_prompt = '''
-        List of agents: {agents}
-        User request: {request}
-        '''
+        return self._build_result(state.blackboard.parse_patch(response))
 
-        messages = [
-            ("system", self.prompt),
-            ("user", user_prompt),
-        ]
+    async def aexecute(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        logger.info(f"Executing Planner Agent")
 
-        prompt = ChatPromptTemplate(messages)
-        response = self.llm.invoke(prompt, is_response_json=True,
-                                   input={"agents": state.agents, "request": state.request})
+        prompt = self.get_prompt_template()
+        response = await self.llm.ainvoke(prompt, is_response_json=True,
+                                          input={"agents": state.agents, "request": state.request, "blackboard": str(state.blackboard)})
 
-        self.blackboard = Blackboard(**response)
-        blackboard_dict = json.loads(self.blackboard.model_dump_json())
-        
-        return {"blackboard": blackboard_dict}
+        return self._build_result(state.blackboard.parse_patch(response))
@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 from app.api.v1.routes import agent
 from app.api.v1.routes import key
+from app.api.v1.routes import device
 
 router = APIRouter()
 
@@ -8,3 +9,5 @@ router.include_router(
     agent.router, tags=["Agent"], prefix="/agent")
 router.include_router(
     key.router, tags=["Key"], prefix="/key")
+router.include_router(
+    device.router, tags=["Device"], prefix="/device")
@@ -1,10 +1,16 @@
 from fastapi import APIRouter, status, HTTPException
-from app.models.agent import AgentRequest, AgentResponse
+from app.models.agent import AgentRequest, AgentResponse, PlanCacheStats, PromptCacheStats
 
+import asyncio
 import json
-from app.services.orchestration import OrchestrationService
+from app.services.orchestration import get_orchestration_service
+from app.services.plan_cache import get_plan_cache
+from app.services.llm import get_prompt_cache_stats, publish_prompt_cache_stats
 from app.models.state import State
+from app.models.budget import Budget
+from app.core.config import cfg
 
+from typing import Dict
 from loguru import logger
 
 
@@ -19,25 +25,69 @@ router = APIRouter()
         response_description="The status of the service.",
         status_code=status.HTTP_200_OK,
         response_model=AgentResponse)
-def run_workflow(request: AgentRequest):
+async def run_workflow(request: AgentRequest):
     if not request.query or request.query == "":
         raise HTTPException(status_code=400, detail="No query provided.")
     
     if not request.owner or request.owner == "":
         raise HTTPException(status_code=400, detail="No owner provided.")
 
-    orchestrator = OrchestrationService()
-    orchestrator.generate_workflow()
-    orchestrator.compile_workflow()
+    orchestrator = get_orchestration_service()
 
-    initial_state = State(request= f"{request.owner}: {request.query}")
+    initial_state = State(
+        request= f"{request.owner}: {request.query}",
+        budget=Budget.start(request.deadline or cfg.REQUEST_DEADLINE, request.token_budget or cfg.REQUEST_TOKEN_BUDGET)
+    )
     try:
-        state_dict = orchestrator.invoke(initial_state.model_dump())
+        state_dict = await orchestrator.ainvoke(initial_state.model_dump())
     except Exception as e:
         logger.error(f"Error: {e}")
         error_message = "An error occurred while running the agent orchestrator: " + str(e)
         raise HTTPException(status_code=500, detail=error_message)
+    finally:
+        await asyncio.to_thread(publish_prompt_cache_stats)
     state = State(**state_dict)  # Convert dictionary back to State model
 
-    return AgentResponse(blackboard=state.blackboard)
+    return AgentResponse(blackboard=state.blackboard, budget=state.budget)
 
+
+@router.get(
+        path="/plan-cache",
+        name="Plan Cache Stats",
+        description=(
+            "Get the hit and miss counters of the first plan cache, of all API and worker processes when "
+            "PLAN_CACHE_REDIS_URL is set, and the number of plans cached in this process."
+        ),
+        status_code=status.HTTP_200_OK,
+        response_model=PlanCacheStats)
+async def get_plan_cache_stats():
+    return PlanCacheStats(**await asyncio.to_thread(get_plan_cache().get_stats))
+
+
+@router.delete(
+        path="/plan-cache",
+        name="Plan Cache Invalidate",
+        description=(
+            "Drop the cached first plans of the API and the workers, e.g. after the agent descriptions or the "
+            "planner prompt changed. Without PLAN_CACHE_REDIS_URL only this process drops its plans."
+        ),
+        status_code=status.HTTP_200_OK,
+        response_model=PlanCacheStats)
+async def invalidate_plan_cache():
+    plan_cache = get_plan_cache()
+    await asyncio.to_thread(plan_cache.invalidate)
+    return PlanCacheStats(**await asyncio.to_thread(plan_cache.get_stats))
+
+
+@router.get(
+        path="/prompt-cache",
+        name="Prompt Cache Stats",
+        description=(
+            "Get the input tokens and the tokens served from the provider's prompt cache per agent, of the API "
+            "and the workers when PROMPT_CACHE_STATS_REDIS_URL is set. Each async task also reports its own in "
+            "budget.cached_tokens."
+        ),
+        status_code=status.HTTP_200_OK,
+        response_model=Dict[str, PromptCacheStats])
+async def get_prompt_cache_stats_by_agent():
+    return await asyncio.to_thread(get_prompt_cache_stats)
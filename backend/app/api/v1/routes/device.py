@@ -0,0 +1,74 @@
+from fastapi import APIRouter, status, HTTPException
+from typing import Dict, List
+import time
+
+from app.models.device import DeviceStatePush, DeviceTwinState, SensorEndpointStats
+from app.services.device_twin import get_device_twin
+from app.services.sensor_client import get_sensor_client
+
+from loguru import logger
+
+
+router = APIRouter()
+
+
+def _get_device_twin():
+    device_twin = get_device_twin()
+    if device_twin is None:
+        raise HTTPException(status_code=409, detail="Device twins are disabled.")
+    return device_twin
+
+
+@router.post(
+        path="/push",
+        name="Device State Push",
+        description=(
+            "Push the latest states of IoT devices, sensor reads are answered from them while they are fresh."
+        ),
+        status_code=status.HTTP_200_OK,
+        response_model=List[DeviceTwinState])
+def push_device_states(pushes: List[DeviceStatePush]):
+    device_twin = _get_device_twin()
+    now = time.time()
+    for push in pushes:
+        if not push.device:
+            raise HTTPException(status_code=400, detail="No device provided.")
+        device_twin.update(push.device, push.value, push.timestamp or now)
+    logger.info(f"Received the states of {len(pushes)} devices")
+
+    # An older push does not replace a newer state, so return what the twins hold now
+    twins = []
+    for device in dict.fromkeys(push.device for push in pushes):
+        twin = device_twin.store.get(device)
+        if twin is not None:
+            value, updated_at = twin
+            twins.append(DeviceTwinState(device=device, value=value, updated_at=updated_at, age=now - updated_at))
+    return twins
+
+
+@router.get(
+        path="/twins",
+        name="Device Twins",
+        description=(
+            "Get the latest known state of every device."
+        ),
+        status_code=status.HTTP_200_OK,
+        response_model=List[DeviceTwinState])
+def get_device_twins():
+    now = time.time()
+    return [
+        DeviceTwinState(device=device, value=value, updated_at=updated_at, age=now - updated_at)
+        for device, (value, updated_at) in sorted(_get_device_twin().store.get_all().items())
+    ]
+
+
+@router.get(
+        path="/sensor-stats",
+        name="Sensor Gateway Stats",
+        description=(
+            "Get the request latency, retries and errors per sensor gateway endpoint in this process."
+        ),
+        status_code=status.HTTP_200_OK,
+        response_model=Dict[str, SensorEndpointStats])
+def get_sensor_stats():
+    return get_sensor_client().get_stats()
@@ -2,11 +2,15 @@ from fastapi import APIRouter, status, HTTPException
 from celery import Celery
 from typing import Dict
 from app.models.agent import AgentRequest
-from app.services.orchestration_async import OrchestrationServiceAsync
+from app.services.orchestration_async import get_orchestration_service_async
 from app.models.state import State
+from app.models.budget import Budget
+from app.core.config import cfg
+from app.services.event_loop import run_coroutine
+from app.services.llm import publish_prompt_cache_stats
 from loguru import logger
 import json
-from app.api.v2.routes.tasks import broadcast_task_update
+from app.services.progress import get_progress_publisher
 
 # Initialize Celery with both broker and result backend
 celery_app = Celery(
@@ -28,16 +32,20 @@ celery_app.conf.update(
 @celery_app.task
 def process_agent_task(request_data: Dict):
     try:
-        orchestrator = OrchestrationServiceAsync(
-            process_agent_task.request.id
-        )
-        orchestrator.generate_workflow()
-        orchestrator.compile_workflow()
+        orchestrator = get_orchestration_service_async()
 
-        initial_state = State(request=f"{request_data['owner']}: {request_data['query']}")
-        state_dict = orchestrator.invoke(initial_state.model_dump())
+        initial_state = State(
+            request=f"{request_data['owner']}: {request_data['query']}",
+            task_id=process_agent_task.request.id,
+            budget=Budget(**request_data["budget"])
+        )
+        # Workflows of all tasks in this worker share one event loop
+        state_dict = run_coroutine(orchestrator.ainvoke(initial_state.model_dump()))
         state = State(**state_dict)
         
+        # The progress of the task reaches the clients before its result
+        get_progress_publisher().flush(cfg.PROGRESS_FLUSH_TIMEOUT)
+
         # Convert blackboard to dictionary for JSON serialization
         blackboard_dict = json.loads(state.blackboard.model_dump_json())
         
@@ -45,22 +53,28 @@ def process_agent_task(request_data: Dict):
         
         return {
             "status": "completed",
-            "blackboard": blackboard_dict
+            "blackboard": blackboard_dict,
+            "budget": state.budget.model_dump()
         }
     except Exception as e:
         logger.error(f"Error in agent task: {e}")
-        # Send error to WebSocket
-        broadcast_task_update(
+        # Send error to WebSocket, after the progress published so far
+        progress_publisher = get_progress_publisher()
+        progress_publisher.publish(
             process_agent_task.request.id,
             {
                 "status": "error",
                 "error": str(e)
             }
         )
+        progress_publisher.flush(cfg.PROGRESS_FLUSH_TIMEOUT)
         return {
             "status": "error",
             "error": str(e)
         }
+    finally:
+        get_progress_publisher().end_task(process_agent_task.request.id)
+        publish_prompt_cache_stats()
 
 router = APIRouter()
 
@@ -78,10 +92,14 @@ async def run_agent_workflow(request: AgentRequest):
     if not request.owner or request.owner == "":
         raise HTTPException(status_code=400, detail="No owner provided.")
 
+    # The deadline counts from now, so the time spent in the queue is part of the budget
+    budget = Budget.start(request.deadline or cfg.REQUEST_DEADLINE, request.token_budget or cfg.REQUEST_TOKEN_BUDGET)
+
     # Queue the task in Celery
     task = process_agent_task.delay({
         "query": request.query,
-        "owner": request.owner
+        "owner": request.owner,
+        "budget": budget.model_dump()
     })
     
     return {
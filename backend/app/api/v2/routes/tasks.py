@@ -1,9 +1,19 @@
-from celery import shared_task
 from fastapi import WebSocket
+from starlette.websockets import WebSocketState
 from loguru import logger
 import json
 import redis
+import redis.asyncio as aioredis
 import asyncio
+import weakref
+from typing import Dict, Optional, Set
+
+from app.services.progress import get_task_snapshot_key
+
+try:
+    import msgpack
+except ImportError:  # Binary encoding of the updates is optional
+    msgpack = None
 
 # Initialize Redis client
 redis_client = redis.Redis(
@@ -14,35 +24,175 @@ redis_client = redis.Redis(
 )
 
 
+# Updates a WebSocket client may fall behind by, it is sent a fresh snapshot after that
+CLIENT_QUEUE_SIZE = 256
+
+# Queued in place of an update to send the client the current snapshot of the task
+SNAPSHOT_REQUEST = None
+
+# Seconds a client waits for the update subscription before it reads the snapshot anyway
+SUBSCRIBE_TIMEOUT = 5.0
+
+
+def get_encodings() -> Set[str]:
+    """Return the encodings the WebSocket clients may ask the updates in"""
+    return {"json", "msgpack"} if msgpack is not None else {"json"}
+
+
+class TaskUpdateHub:
+    """
+    Pattern-subscribes once to the channels of all tasks and fans their updates out to the queues of the
+    WebSocket clients of this process, so the Redis connections do not grow with the clients. The
+    subscription is kept for the lifetime of the event loop, clients never wait for a new one.
+    """
+    def __init__(self, client: aioredis.Redis):
+        self.client = client
+        self.queues: Dict[str, Set[asyncio.Queue]] = {}
+        self.listener: Optional[asyncio.Task] = None
+        # Set while the pattern subscription is live
+        self.subscribed = asyncio.Event()
+        self.was_subscribed = False
+
+    async def subscribe(self, task_id: str) -> asyncio.Queue:
+        """Return the update queue of a new client of the task, once the updates published from now on reach it"""
+        queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self.queues.setdefault(task_id, set()).add(queue)
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.create_task(self._listen())
+        try:
+            await asyncio.wait_for(self.subscribed.wait(), SUBSCRIBE_TIMEOUT)
+        except asyncio.TimeoutError:
+            # The client gets a snapshot once the subscription is back
+            logger.warning(f"Task update subscription is not live, client of task {task_id} may miss updates")
+        except BaseException:
+            self.unsubscribe(task_id, queue)
+            raise
+        return queue
+
+    def unsubscribe(self, task_id: str, queue: asyncio.Queue):
+        queues = self.queues.get(task_id, set())
+        queues.discard(queue)
+        if not queues:
+            self.queues.pop(task_id, None)
+
+    def request_snapshot(self, queue: asyncio.Queue):
+        """Queue the current snapshot of the task for a client that missed an update"""
+        if queue.full():
+            self._clear(queue)
+        queue.put_nowait(SNAPSHOT_REQUEST)
+
+    def _clear(self, queue: asyncio.Queue):
+        while not queue.empty():
+            queue.get_nowait()
+
+    def _dispatch(self, channel: str, data: str):
+        task_id = channel.split(":", 1)[1]
+        for queue in self.queues.get(task_id, ()):
+            if queue.full():
+                # The snapshot replaces the deltas the client fell behind on
+                logger.warning(f"WebSocket client of task {task_id} is too slow, resyncing it")
+                self._clear(queue)
+                queue.put_nowait(SNAPSHOT_REQUEST)
+            queue.put_nowait(data)
+
+    def _on_subscribed(self):
+        self.subscribed.set()
+        if self.was_subscribed:
+            # Updates published while the subscription was down are lost, every client starts over from a snapshot
+            for queues in self.queues.values():
+                for queue in queues:
+                    self.request_snapshot(queue)
+        self.was_subscribed = True
+
+    async def _listen(self):
+        while True:
+            pubsub = self.client.pubsub()
+            try:
+                await pubsub.psubscribe("task:*")
+                async for message in pubsub.listen():
+                    # Redis confirms once the subscription is active
+                    if message['type'] == 'psubscribe':
+                        self._on_subscribed()
+                    elif message['type'] == 'pmessage':
+                        self._dispatch(message['channel'], message['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in task update subscription: {e}")
+                await asyncio.sleep(1)
+            finally:
+                self.subscribed.clear()
+                # Drops the subscription with its connection
+                await pubsub.reset()
+
+
+# One hub per event loop, its queues and connection belong to the loop
+_task_update_hubs = weakref.WeakKeyDictionary()
+
+
+def get_task_update_hub() -> TaskUpdateHub:
+    """Return the task update hub of the running event loop"""
+    loop = asyncio.get_running_loop()
+    if loop not in _task_update_hubs:
+        # The hub waits on the event loop for messages instead of polling
+        _task_update_hubs[loop] = TaskUpdateHub(aioredis.Redis(host='redis', port=6379, db=0, decode_responses=True))
+    return _task_update_hubs[loop]
+
+
 async def connect(websocket: WebSocket, task_id: str):
     logger.info(f"Connecting to task {task_id}")
     await websocket.accept()
 
 async def disconnect(websocket: WebSocket, task_id: str):
     logger.info(f"Disconnecting from task {task_id}")
-    await websocket.close()
+    if websocket.client_state != WebSocketState.DISCONNECTED:
+        await websocket.close()
     logger.info(f"Disconnected from task {task_id}")
 
-@shared_task
-def broadcast_task_update(task_id: str, message: dict):
-    """Celery task to broadcast updates to WebSocket clients"""
-    # Publish message to Redis channel
+def publish_task_update(task_id: str, message: dict):
+    """Publish an update to the WebSocket clients of a task right away"""
     redis_client.publish(f"task:{task_id}", json.dumps(message))
-    logger.info(f"Published message to task:{task_id}")
 
-async def subscribe_to_task(task_id: str, websocket: WebSocket):
-    """Subscribe to Redis channel for a task"""
-    pubsub = redis_client.pubsub()
-    pubsub.subscribe(f"task:{task_id}")
-    
+def is_resync_request(text: str) -> bool:
+    """Return whether a client message asks for the current snapshot of the task"""
+    try:
+        message = json.loads(text)
+    except ValueError:
+        return False
+    return isinstance(message, dict) and message.get("type") == "resync"
+
+async def send_task_update(websocket: WebSocket, data: str, encoding: str = "json"):
+    # Updates are published as JSON already
+    if encoding == "msgpack":
+        await websocket.send_bytes(msgpack.packb(json.loads(data)))
+    else:
+        await websocket.send_text(data)
+
+async def send_task_snapshot(task_id: str, websocket: WebSocket, encoding: str = "json"):
+    """Send the last blackboard snapshot of the task, if it published one"""
+    try:
+        snapshot = await get_task_update_hub().client.get(get_task_snapshot_key(task_id))
+    except redis.RedisError as e:
+        # The client still gets the live updates and asks again on the next one
+        logger.warning(f"Reading the snapshot of task {task_id} failed: {e}")
+        return
+    if snapshot is not None:
+        await send_task_update(websocket, snapshot, encoding)
+
+async def subscribe_to_task(task_id: str, websocket: WebSocket, queue: asyncio.Queue, encoding: str = "json"):
+    """
+    Send the snapshot of a task, then forward its updates from the hub queue until the subscription is
+    cancelled. Deltas queued before the snapshot was read are at most as new as it, the client skips them.
+    """
     try:
+        await send_task_snapshot(task_id, websocket, encoding)
         while True:
-            message = pubsub.get_message(ignore_subscribe_messages=True)
-            if message and message['type'] == 'message':
-                data = json.loads(message['data'])
-                await websocket.send_json(data)
-            await asyncio.sleep(0.1)
+            data = await queue.get()
+            if data is SNAPSHOT_REQUEST:
+                await send_task_snapshot(task_id, websocket, encoding)
+            else:
+                await send_task_update(websocket, data, encoding)
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
         logger.error(f"Error in subscription: {e}")
-    finally:
-        pubsub.unsubscribe()
\ No newline at end of file
@@ -1,24 +1,34 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
 from loguru import logger
-from app.api.v2.routes.tasks import connect, disconnect, subscribe_to_task
+from app.api.v2.routes.tasks import (
+    connect, disconnect, get_encodings, get_task_update_hub, is_resync_request, subscribe_to_task
+)
 import asyncio
 
 router = APIRouter()
 
 @router.websocket("/task/{task_id}")
-async def websocket_endpoint(websocket: WebSocket, task_id: str):
+async def websocket_endpoint(websocket: WebSocket, task_id: str, encoding: str = "json"):
+    if encoding not in get_encodings():
+        logger.warning(f"Unsupported update encoding {encoding} for task {task_id}")
+        await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+        return
+
     await connect(websocket, task_id)
+    # Subscribed before the snapshot is read, so no update falls between the two
+    hub = get_task_update_hub()
+    queue = await hub.subscribe(task_id)
+    subscription_task = asyncio.create_task(subscribe_to_task(task_id, websocket, queue, encoding))
     try:
-        # Start subscription in background
-        subscription_task = asyncio.create_task(subscribe_to_task(task_id, websocket))
-        # Keep connection alive
         while True:
-            await websocket.receive_text()
-    except asyncio.TimeoutError:
-        logger.info("WebSocket timeout, keeping connection alive")
+            # Clients that missed an update ask for the current snapshot
+            if is_resync_request(await websocket.receive_text()):
+                hub.request_snapshot(queue)
     except WebSocketDisconnect:
         pass
     finally:
-        if 'subscription_task' in locals():
-            subscription_task.cancel()
-        await disconnect(websocket, task_id) 
\ No newline at end of file
+        # Unsubscribed before anything is awaited, the handler itself may be cancelled while it cleans up
+        hub.unsubscribe(task_id, queue)
+        subscription_task.cancel()
+        await asyncio.gather(subscription_task, return_exceptions=True)
+        await disconnect(websocket, task_id)
@@ -1,5 +1,7 @@
 from starlette.config import Config
 from pydantic_settings import BaseSettings
+from typing import Dict, List, Optional
+import json
 
 config = Config(".env")
 
@@ -9,5 +11,70 @@ class Cfg(BaseSettings):
     API_PREFIX: str = "/api"
     DEBUG: bool = config("DEBUG", cast=bool, default=False)
 
+    # LLM client
+    LLM_MODEL: str = config("LLM_MODEL", default="gpt-4o")
+    LLM_MAX_CONNECTIONS: int = config("LLM_MAX_CONNECTIONS", cast=int, default=20)
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = config("LLM_MAX_KEEPALIVE_CONNECTIONS", cast=int, default=10)
+    LLM_KEEPALIVE_EXPIRY: float = config("LLM_KEEPALIVE_EXPIRY", cast=float, default=30.0)
+    PROMPT_CACHE_STATS_REDIS_URL: str = config("PROMPT_CACHE_STATS_REDIS_URL", default="redis://redis:6379/1")  # Empty for per-process stats
+
+    # LLM response cache
+    LLM_CACHE: str = config("LLM_CACHE", default="memory")  # off, memory, redis (memory in front of redis)
+    LLM_CACHE_TTL: float = config("LLM_CACHE_TTL", cast=float, default=3600.0)
+    LLM_CACHE_MAX_ENTRIES: int = config("LLM_CACHE_MAX_ENTRIES", cast=int, default=1024)
+    LLM_CACHE_MAX_VALUE_BYTES: int = config("LLM_CACHE_MAX_VALUE_BYTES", cast=int, default=65536)
+    LLM_CACHE_REDIS_URL: str = config("LLM_CACHE_REDIS_URL", default="redis://redis:6379/1")
+
+    # Edge agents
+    EDGE_AGENTS_EXECUTION_MODE: str = config("EDGE_AGENTS_EXECUTION_MODE", default="concurrent")  # sequential, concurrent, fused
+    EDGE_AGENTS_MAX_WORKERS: int = config("EDGE_AGENTS_MAX_WORKERS", cast=int, default=4)
+    EDGE_AGENTS_MAX_WAVES: Optional[int] = config("EDGE_AGENTS_MAX_WAVES", cast=int, default=None)  # Defaults to the number of plan steps
+
+    # Tool calls
+    TOOL_CALL_TIMEOUT: float = config("TOOL_CALL_TIMEOUT", cast=float, default=10.0)
+    TOOL_CALL_MAX_WORKERS: int = config("TOOL_CALL_MAX_WORKERS", cast=int, default=16)
+    TOOL_CALL_STREAMING: bool = config("TOOL_CALL_STREAMING", cast=bool, default=True)  # Start tools while the model streams
+    TOOL_RESULT_CACHE: bool = config("TOOL_RESULT_CACHE", cast=bool, default=True)  # TTLs are set per tool by each edge agent
+    TOOL_RESULT_CACHE_MAX_ENTRIES: int = config("TOOL_RESULT_CACHE_MAX_ENTRIES", cast=int, default=1024)
+    # Identical concurrent calls of read tools share one upstream call
+    SINGLE_FLIGHT: str = config("SINGLE_FLIGHT", default="memory")  # off, memory (threads of a worker), redis (across workers)
+    SINGLE_FLIGHT_TIMEOUT: float = config("SINGLE_FLIGHT_TIMEOUT", cast=float, default=10.0)  # Waiting callers call again after it
+    SINGLE_FLIGHT_REDIS_URL: str = config("SINGLE_FLIGHT_REDIS_URL", default="redis://redis:6379/1")
+
+    # First plans of recurring requests, keyed on the normalized request and the agent catalog
+    PLAN_CACHE: bool = config("PLAN_CACHE", cast=bool, default=True)
+    PLAN_CACHE_TTL: float = config("PLAN_CACHE_TTL", cast=float, default=86400.0)
+    PLAN_CACHE_MAX_ENTRIES: int = config("PLAN_CACHE_MAX_ENTRIES", cast=int, default=256)
+    PLAN_CACHE_REDIS_URL: str = config("PLAN_CACHE_REDIS_URL", default="redis://redis:6379/1")  # Empty for per-process invalidation
+
+    # Sensor gateway and the device twins that answer sensor reads from pushed or polled states
+    SENSOR_GATEWAY_URL: str = config("SENSOR_GATEWAY_URL", default="https://sensors.davidoglu.vip/api/v1")
+    SENSOR_CONNECT_TIMEOUT: float = config("SENSOR_CONNECT_TIMEOUT", cast=float, default=2.0)
+    SENSOR_READ_TIMEOUT: float = config("SENSOR_READ_TIMEOUT", cast=float, default=5.0)
+    # Per endpoint [connect, read] timeouts as JSON, e.g. {"iot-2/heading": [1.0, 2.0]}
+    SENSOR_ENDPOINT_TIMEOUTS: Dict[str, List[float]] = config("SENSOR_ENDPOINT_TIMEOUTS", cast=json.loads, default="{}")
+    SENSOR_MAX_RETRIES: int = config("SENSOR_MAX_RETRIES", cast=int, default=2)
+    SENSOR_RETRY_BACKOFF: float = config("SENSOR_RETRY_BACKOFF", cast=float, default=0.2)  # Upper bound of the first jittered delay
+    SENSOR_MAX_CONNECTIONS: int = config("SENSOR_MAX_CONNECTIONS", cast=int, default=10)
+    SENSOR_KEEPALIVE_EXPIRY: float = config("SENSOR_KEEPALIVE_EXPIRY", cast=float, default=30.0)
+    DEVICE_TWIN: str = config("DEVICE_TWIN", default="memory")  # off, memory, redis (shared with the Celery workers)
+    DEVICE_TWIN_MAX_AGE: float = config("DEVICE_TWIN_MAX_AGE", cast=float, default=10.0)  # Older states are read live
+    DEVICE_TWIN_POLL_INTERVAL: float = config("DEVICE_TWIN_POLL_INTERVAL", cast=float, default=0.0)  # 0 disables polling
+    DEVICE_TWIN_REDIS_URL: str = config("DEVICE_TWIN_REDIS_URL", default="redis://redis:6379/1")
+
+    # Speculative prefetch of read-only tools while the planner runs
+    SPECULATIVE_PREFETCH: bool = config("SPECULATIVE_PREFETCH", cast=bool, default=False)
+    PREFETCH_TTL: float = config("PREFETCH_TTL", cast=float, default=60.0)
+
+    # Task progress published to the WebSocket clients from the workers
+    PROGRESS_REDIS_URL: str = config("PROGRESS_REDIS_URL", default="redis://redis:6379/0")
+    PROGRESS_MAX_BATCH: int = config("PROGRESS_MAX_BATCH", cast=int, default=100)
+    PROGRESS_FLUSH_TIMEOUT: float = config("PROGRESS_FLUSH_TIMEOUT", cast=float, default=5.0)  # Wait at the end of a task
+    PROGRESS_SNAPSHOT_TTL: int = config("PROGRESS_SNAPSHOT_TTL", cast=int, default=3600)  # Blackboard snapshot kept for late clients
+
+    # Per-request budget, a request is finalized with its current history once it runs out
+    REQUEST_DEADLINE: Optional[float] = config("REQUEST_DEADLINE", cast=float, default=60.0)
+    REQUEST_TOKEN_BUDGET: Optional[int] = config("REQUEST_TOKEN_BUDGET", cast=int, default=None)
+
 
 cfg = Cfg()
@@ -1,10 +1,29 @@
 from pydantic import BaseModel
+from typing import Optional
 from app.models.blackboard import Blackboard
+from app.models.budget import Budget
 
 
 class AgentRequest  (BaseModel):
     query: str
     owner: str = "user"
+    deadline: Optional[float] = None  # Seconds the request may take, defaults to REQUEST_DEADLINE
+    token_budget: Optional[int] = None  # LLM tokens the request may use, defaults to REQUEST_TOKEN_BUDGET
 
 class AgentResponse(BaseModel):
-    blackboard: Blackboard
\ No newline at end of file
+    blackboard: Blackboard
+    budget: Optional[Budget] = None
+
+
+class PlanCacheStats(BaseModel):
+    hits: int = 0  # Of all processes when the plan cache is shared through Redis
+    misses: int = 0
+    hit_rate: float = 0.0
+    entries: int = 0  # Plans cached in the process that answered
+
+
+class PromptCacheStats(BaseModel):
+    llm_calls: int = 0
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    hit_rate: float = 0.0
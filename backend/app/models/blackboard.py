@@ -1,4 +1,4 @@
-from typing import List
+from typing import Any, Dict, List, Optional, Union
 from enum import Enum
 from pydantic import BaseModel
 
@@ -17,18 +17,28 @@ class Step(BaseModel):
     agent: str
     description: str
     status: Status = Status.PENDING
+    id: Optional[str] = None
+    depends_on: List[str] = []
+    condition: Optional[str] = None
+    tool: Optional[str] = None
+    args: Dict[str, Any] = {}
 
     class Config:
         use_enum_values = True
 
     def __str__(self):
-        return f"- Agent: {self.agent}\n- Description: {self.description}\n- Status: {self.status}"
+        return f"- Id: {self.id}\n- Agent: {self.agent}\n- Description: {self.description}\n- Status: {self.status}\n- Depends on: {self.depends_on}\n- Condition: {self.condition}\n- Tool: {self.tool}\n- Args: {self.args}"
     
     def get_schema():
         return f"""
+        - id: string (unique step id, e.g. "check_weather")
         - agent: string
         - description: string
         - status: {Status.get_schema()}
+        - depends_on: list of step ids that must be completed before this step can run
+        - condition: string or null (a condition on earlier results that must be decided before this step can run)
+        - tool: string or null (name of the single agent tool that fully performs this step)
+        - args: object (arguments for the tool, empty if the tool takes none)
         """
 
 class Plan(BaseModel):
@@ -67,6 +77,58 @@ class History(BaseModel):
             {Status.get_schema()}
         """
 
+# Step fields a patch may clear with null
+NULLABLE_STEP_FIELDS = {"condition"}
+
+class StepUpdate(BaseModel):
+    id: str
+    status: Optional[Status] = None
+    description: Optional[str] = None
+    condition: Optional[str] = None
+
+    class Config:
+        use_enum_values = True
+
+class BlackboardPatch(BaseModel):
+    """
+    Changes an agent makes to the blackboard, applied by the engine to the authoritative blackboard.
+    """
+    plan_status: Optional[Status] = None
+    update_steps: List[StepUpdate] = []
+    add_steps: List[Step] = []
+    add_history: List[Step] = []
+
+    class Config:
+        use_enum_values = True
+
+    def __str__(self):
+        return f"Plan status: {self.plan_status}\nUpdated steps: {self.update_steps}\nAdded steps: {self.add_steps}\nAdded history: {self.add_history}"
+
+    def is_empty(self) -> bool:
+        return self.plan_status is None and not self.update_steps and not self.add_steps and not self.add_history
+
+    def extend(self, patch: "BlackboardPatch"):
+        """Add the changes of a later patch to this one"""
+        self.update_steps.extend(patch.update_steps)
+        self.add_steps.extend(patch.add_steps)
+        self.add_history.extend(patch.add_history)
+        if patch.plan_status is not None:
+            self.plan_status = patch.plan_status
+
+    def get_schema():
+        return f"""
+        - plan_status: string or null (new status of the whole plan, null to keep it)
+        - update_steps: list of changes to existing plan steps, each with
+            - id: string (id of the plan step to change)
+            - status: string (pending, in_progress, completed, failed), omit to keep it
+            - description: string, omit to keep it
+            - condition: string or null, omit to keep it
+        - add_steps: list of new plan steps, each with
+            {Step.get_schema()}
+        - add_history: list of new history entries, each with
+            {Step.get_schema()}
+        """
+
 class Blackboard(BaseModel):
     plan: Plan = Plan(steps=[], status=Status.PENDING)
     history: History = History(steps=[], status=Status.PENDING)
@@ -76,6 +138,130 @@ class Blackboard(BaseModel):
 
     def __str__(self):
         return f"Plan: {self.plan}\nHistory: {self.history}"
+
+    def apply_patch(self, patch: "BlackboardPatch", owners: Union[str, List[str], None] = None) -> "Blackboard":
+        """
+        Return a copy of the blackboard with the patch applied.
+        If owners are given, the patch may only change the plan steps of those agents and cannot add any,
+        re-planning is left to the orchestration agent.
+        """
+        patched = self.model_copy(deep=True)
+        owners = {owners} if isinstance(owners, str) else set(owners) if owners is not None else None
+        steps_by_id = {step.id: step for step in patched.plan.steps if step.id}
+
+        for step_update in patch.update_steps:
+            step = steps_by_id.get(step_update.id)
+            if step is None or (owners is not None and step.agent not in owners):
+                continue
+            # Only the fields the agent actually set are changed, so a condition can be cleared with null
+            for field in step_update.model_fields_set - {"id"}:
+                value = getattr(step_update, field)
+                # A step always has a status and a description, null keeps them
+                if value is None and field not in NULLABLE_STEP_FIELDS:
+                    continue
+                setattr(step, field, value)
+
+        for new_step in patch.add_steps:
+            if owners is not None or new_step.id in steps_by_id:
+                continue
+            patched.plan.steps.append(new_step.model_copy())
+        patched.history.steps.extend(step.model_copy() for step in patch.add_history)
+
+        if patch.plan_status is not None:
+            patched.plan.status = patch.plan_status
+
+        patched.assign_step_ids()
+        return patched
+
+    def get_patch(self, update: "Blackboard") -> "BlackboardPatch":
+        """
+        Return the patch that turns this blackboard into the given one.
+        Steps are matched by id, with their position as a fallback for steps without one.
+        """
+        steps_by_id = {step.id: step for step in self.plan.steps if step.id}
+        patch = BlackboardPatch()
+        for position, updated_step in enumerate(update.plan.steps):
+            if updated_step.id in steps_by_id:
+                step = steps_by_id[updated_step.id]
+            elif updated_step.id is None and position < len(self.plan.steps):
+                step = self.plan.steps[position]
+            else:
+                patch.add_steps.append(updated_step)
+                continue
+
+            if step.id is None:
+                # Steps are addressed by id, the engine assigns one to every step
+                continue
+            changes = {field: getattr(updated_step, field) for field in ("status", "description", "condition")
+                       if getattr(updated_step, field) != getattr(step, field)}
+            if changes:
+                patch.update_steps.append(StepUpdate(id=step.id, **changes))
+
+        patch.add_history = update.history.steps[len(self.history.steps):]
+        if update.plan.status != self.plan.status:
+            patch.plan_status = update.plan.status
+        return patch
+
+    def parse_patch(self, response: Dict[str, Any]) -> "BlackboardPatch":
+        """
+        Read an agent response as a patch of this blackboard. A full blackboard is accepted as well and diffed.
+        """
+        if "plan" in response or "history" in response:
+            return self.get_patch(Blackboard(**response))
+        return BlackboardPatch(**response)
+
+    def assign_step_ids(self):
+        """
+        Give every plan step without an id a unique one.
+        """
+        used_ids = {step.id for step in self.plan.steps if step.id}
+        next_id = 1
+        for step in self.plan.steps:
+            if step.id:
+                continue
+            while f"step-{next_id}" in used_ids:
+                next_id += 1
+            step.id = f"step-{next_id}"
+            used_ids.add(step.id)
+
+    def get_ready_steps(self) -> List[Step]:
+        """
+        Return the pending steps whose dependencies are all completed and that do not wait for a decision.
+        Dependencies on unknown step ids are considered satisfied.
+        """
+        status_by_id = {step.id: step.status for step in self.plan.steps if step.id}
+        return [
+            step for step in self.plan.steps
+            if step.status == Status.PENDING
+            and step.condition is None
+            and all(status_by_id.get(dependency, Status.COMPLETED) == Status.COMPLETED
+                    for dependency in step.depends_on)
+        ]
+
+    def get_critical_path_lengths(self) -> Dict[str, int]:
+        """
+        Return, for every step id, the length of the longest chain of steps that (transitively) wait on it.
+        """
+        dependents = {}
+        for step in self.plan.steps:
+            for dependency in step.depends_on:
+                dependents.setdefault(dependency, []).append(step.id)
+
+        lengths = {}
+
+        def get_length(step_id: str, visiting: set) -> int:
+            if step_id in lengths:
+                return lengths[step_id]
+            if step_id in visiting:
+                # Cycles are broken here instead of recursing forever
+                return 0
+            visiting.add(step_id)
+            length = 1 + max((get_length(dependent, visiting) for dependent in dependents.get(step_id, [])), default=0)
+            visiting.discard(step_id)
+            lengths[step_id] = length
+            return length
+
+        return {step.id: get_length(step.id, set()) for step in self.plan.steps if step.id}
     
     def get_schema(self):
         return f"""
@@ -0,0 +1,53 @@
+import time
+from typing import Optional
+from pydantic import BaseModel, Field
+
+
+class Budget(BaseModel):
+    """Wall-clock and token budget of a single request"""
+    deadline: Optional[float] = None  # Unix timestamp after which no new node is started
+    max_tokens: Optional[int] = None
+    started_at: float = Field(default_factory=time.time)
+    tokens_used: int = 0
+    cached_tokens: int = 0  # Input tokens served from the provider's prompt cache
+    llm_calls: int = 0
+    llm_seconds: float = 0.0
+    exhausted: Optional[str] = None  # Reason the request was finalized early
+
+    @classmethod
+    def start(cls, timeout: Optional[float] = None, max_tokens: Optional[int] = None) -> "Budget":
+        """Create the budget of a request that may take timeout seconds from now"""
+        now = time.time()
+        return cls(deadline=now + timeout if timeout is not None else None, max_tokens=max_tokens, started_at=now)
+
+    def get_elapsed_time(self) -> float:
+        return time.time() - self.started_at
+
+    def get_remaining_time(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.time())
+
+    def get_remaining_tokens(self) -> Optional[int]:
+        if self.max_tokens is None:
+            return None
+        return max(0, self.max_tokens - self.tokens_used)
+
+    def check(self) -> Optional[str]:
+        """
+        Return why the next LLM round can not be afforded, or None if it can.
+        A round is expected to cost as much as the average LLM call so far.
+        """
+        remaining_time = self.get_remaining_time()
+        if remaining_time is not None:
+            expected_time = self.llm_seconds / self.llm_calls if self.llm_calls > 0 else 0.0
+            if remaining_time <= expected_time:
+                return "deadline"
+
+        remaining_tokens = self.get_remaining_tokens()
+        if remaining_tokens is not None:
+            expected_tokens = self.tokens_used / self.llm_calls if self.llm_calls > 0 else 0
+            if remaining_tokens <= expected_tokens:
+                return "token_budget"
+
+        return None
@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from typing import Any, Optional
+
+
+class DeviceStatePush(BaseModel):
+    device: str  # Path of the device below SENSOR_GATEWAY_URL, e.g. iot-1/temperature
+    value: Any  # State as the gateway reports it
+    timestamp: Optional[float] = None  # Unix time the state was measured, defaults to now and never later
+
+class DeviceTwinState(BaseModel):
+    device: str
+    value: Any = None
+    updated_at: float
+    age: float  # Seconds since the state was measured
+
+class SensorEndpointStats(BaseModel):
+    requests: int = 0
+    retries: int = 0
+    errors: int = 0
+    mean_ms: float = 0.0
+    p50_ms: float = 0.0
+    p95_ms: float = 0.0
+    max_ms: float = 0.0
@@ -1,6 +1,8 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from uuid import uuid4
 from app.models.blackboard import Blackboard, Plan, History
+from app.models.budget import Budget
 
 
 class State(BaseModel):
@@ -60,3 +62,9 @@ class State(BaseModel):
         plan=Plan(steps=[]),
         history=History(steps=[]),
     )
+    # Per-request bookkeeping lives in the state so that a single compiled
+    # workflow can be shared across concurrent requests.
+    iteration_count: int = 0
+    task_id: Optional[str] = None
+    request_id: str = Field(default_factory=lambda: uuid4().hex)
+    budget: Budget = Field(default_factory=Budget)
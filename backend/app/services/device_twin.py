@@ -0,0 +1,244 @@
+import asyncio
+import copy
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import redis
+from loguru import logger
+
+from app.core.config import cfg
+from app.services.sensor_client import get_sensor_client
+
+# Devices of the sensor gateway, as paths below SENSOR_GATEWAY_URL
+TEMPERATURE_DEVICE = "iot-1/temperature"
+HUMIDITY_DEVICE = "iot-1/humidity"
+OCCUPANCY_DEVICE = "iot-2/occupancy"
+HEADING_DEVICE = "iot-2/heading"
+SENSOR_DEVICES = (TEMPERATURE_DEVICE, HUMIDITY_DEVICE, OCCUPANCY_DEVICE, HEADING_DEVICE)
+
+# Stores a twin unless the stored one is newer, in one step so concurrent writers can not reorder it
+SET_TWIN_SCRIPT = """
+local twin = redis.call("hget", KEYS[1], ARGV[1])
+if twin and cjson.decode(twin)["updated_at"] > tonumber(ARGV[3]) then
+    return 0
+end
+redis.call("hset", KEYS[1], ARGV[1], ARGV[2])
+return 1
+"""
+
+
+def fetch_device_state(device: str) -> Any:
+    """Read the current state of a device from the sensor gateway"""
+    return get_sensor_client().get(device)
+
+
+async def afetch_device_state(device: str) -> Any:
+    """Read the current state of a device from the sensor gateway asynchronously"""
+    return await get_sensor_client().aget(device)
+
+
+class DeviceTwinStore(ABC):
+    """
+    Latest known state of every device with the time it was reported. Subclasses implement get, set and get_all,
+    the async variants run them in a thread unless the store never blocks.
+    """
+    @abstractmethod
+    def get(self, device: str) -> Optional[Tuple[Any, float]]:
+        pass
+
+    @abstractmethod
+    def set(self, device: str, value: Any, updated_at: float):
+        pass
+
+    @abstractmethod
+    def get_all(self) -> Dict[str, Tuple[Any, float]]:
+        pass
+
+    async def aget(self, device: str) -> Optional[Tuple[Any, float]]:
+        return await asyncio.to_thread(self.get, device)
+
+    async def aset(self, device: str, value: Any, updated_at: float):
+        await asyncio.to_thread(self.set, device, value, updated_at)
+
+
+class MemoryDeviceTwinStore(DeviceTwinStore):
+    """Twins of this process only"""
+    def __init__(self):
+        self.twins: Dict[str, Tuple[Any, float]] = {}
+        self.lock = threading.Lock()
+
+    def get(self, device: str) -> Optional[Tuple[Any, float]]:
+        with self.lock:
+            twin = self.twins.get(device)
+        if twin is None:
+            return None
+        # Callers get their own copy, states are often dicts
+        return copy.deepcopy(twin[0]), twin[1]
+
+    def set(self, device: str, value: Any, updated_at: float):
+        value = copy.deepcopy(value)
+        with self.lock:
+            # Pushes and polls may arrive out of order, an older state never replaces a newer one
+            twin = self.twins.get(device)
+            if twin is None or twin[1] <= updated_at:
+                self.twins[device] = (value, updated_at)
+
+    def get_all(self) -> Dict[str, Tuple[Any, float]]:
+        with self.lock:
+            return copy.deepcopy(self.twins)
+
+    async def aget(self, device: str) -> Optional[Tuple[Any, float]]:
+        return self.get(device)
+
+    async def aset(self, device: str, value: Any, updated_at: float):
+        self.set(device, value, updated_at)
+
+
+class RedisDeviceTwinStore(DeviceTwinStore):
+    """Twins shared by the API and the Celery workers, kept in a Redis hash"""
+    key = "device-twin"
+
+    def __init__(self, url: str):
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.set_twin = self.client.register_script(SET_TWIN_SCRIPT)
+
+    def get(self, device: str) -> Optional[Tuple[Any, float]]:
+        try:
+            twin = self.client.hget(self.key, device)
+        except redis.RedisError as e:
+            logger.warning(f"Device twin lookup failed: {e}")
+            return None
+        return self._load(twin) if twin is not None else None
+
+    def set(self, device: str, value: Any, updated_at: float):
+        twin = json.dumps({"value": value, "updated_at": updated_at}, default=str)
+        try:
+            self.set_twin(keys=[self.key], args=[device, twin, repr(updated_at)])
+        except redis.RedisError as e:
+            logger.warning(f"Device twin store failed: {e}")
+
+    def get_all(self) -> Dict[str, Tuple[Any, float]]:
+        try:
+            twins = self.client.hgetall(self.key)
+        except redis.RedisError as e:
+            logger.warning(f"Device twin lookup failed: {e}")
+            return {}
+        return {device: self._load(twin) for device, twin in twins.items()}
+
+    def _load(self, twin: str) -> Tuple[Any, float]:
+        twin = json.loads(twin)
+        return twin["value"], twin["updated_at"]
+
+
+class DeviceTwin:
+    """
+    Answers device reads from the latest pushed or polled state while it is at most max_age seconds old,
+    and reads the gateway live otherwise.
+    """
+    def __init__(self, store: DeviceTwinStore, max_age: float):
+        self.store = store
+        self.max_age = max_age
+        self._poller = None
+        self._stop_polling = threading.Event()
+
+    def update(self, device: str, value: Any, updated_at: Optional[float] = None):
+        now = time.time()
+        if updated_at is None:
+            updated_at = now
+        elif updated_at > now:
+            # A state from the future would stay fresh and block every live read, e.g. on gateway clock skew
+            logger.warning(f"State of {device} is {updated_at - now:.1f}s in the future, using the current time")
+            updated_at = now
+        self.store.set(device, value, updated_at)
+
+    def _get_fresh(self, twin: Optional[Tuple[Any, float]], max_age: Optional[float]) -> Tuple[bool, Any]:
+        if twin is None:
+            return False, None
+        value, updated_at = twin
+        max_age = max_age if max_age is not None else self.max_age
+        return time.time() - updated_at <= max_age, value
+
+    def read(self, device: str, max_age: Optional[float] = None) -> Any:
+        fresh, value = self._get_fresh(self.store.get(device), max_age)
+        if fresh:
+            return value
+        logger.info(f"Device twin of {device} is stale, reading it live")
+        value = fetch_device_state(device)
+        self.update(device, value)
+        return value
+
+    async def aread(self, device: str, max_age: Optional[float] = None) -> Any:
+        fresh, value = self._get_fresh(await self.store.aget(device), max_age)
+        if fresh:
+            return value
+        logger.info(f"Device twin of {device} is stale, reading it live")
+        value = await afetch_device_state(device)
+        await self.store.aset(device, value, time.time())
+        return value
+
+    def poll(self, devices: Iterable[str]):
+        """Refresh the twins of the devices from the gateway"""
+        for device in devices:
+            try:
+                self.update(device, fetch_device_state(device))
+            except Exception as e:
+                logger.warning(f"Polling {device} failed: {e}")
+
+    def start_poller(self, devices: Iterable[str], interval: float):
+        """Poll the devices every interval seconds in a background thread"""
+        if self._poller is not None:
+            return
+        devices = list(devices)
+
+        def run():
+            while not self._stop_polling.is_set():
+                self.poll(devices)
+                self._stop_polling.wait(interval)
+
+        self._poller = threading.Thread(target=run, name="device-twin-poller", daemon=True)
+        self._poller.start()
+
+    def stop_poller(self):
+        self._stop_polling.set()
+
+
+_device_twin = None
+_device_twin_lock = threading.Lock()
+
+
+def get_device_twin() -> Optional[DeviceTwin]:
+    """Return the process-wide device twin configured by DEVICE_TWIN, None if twins are off"""
+    global _device_twin
+    if cfg.DEVICE_TWIN == "off":
+        return None
+    with _device_twin_lock:
+        if _device_twin is None:
+            if cfg.DEVICE_TWIN == "memory":
+                store = MemoryDeviceTwinStore()
+            elif cfg.DEVICE_TWIN == "redis":
+                store = RedisDeviceTwinStore(cfg.DEVICE_TWIN_REDIS_URL)
+            else:
+                raise ValueError(f"Unknown DEVICE_TWIN: {cfg.DEVICE_TWIN}")
+            _device_twin = DeviceTwin(store, cfg.DEVICE_TWIN_MAX_AGE)
+            if cfg.DEVICE_TWIN_POLL_INTERVAL > 0:
+                _device_twin.start_poller(SENSOR_DEVICES, cfg.DEVICE_TWIN_POLL_INTERVAL)
+        return _device_twin
+
+
+def read_device(device: str) -> Any:
+    """Read the state of a device through its twin, or live if twins are off"""
+    device_twin = get_device_twin()
+    if device_twin is None:
+        return fetch_device_state(device)
+    return device_twin.read(device)
+
+
+async def aread_device(device: str) -> Any:
+    """Read the state of a device through its twin asynchronously, or live if twins are off"""
+    device_twin = get_device_twin()
+    if device_twin is None:
+        return await afetch_device_state(device)
+    return await device_twin.aread(device)
@@ -0,0 +1,24 @@
+import asyncio
+import threading
+
+# Process-wide event loop running in a background thread. Synchronous callers
+# (e.g. Celery tasks) submit their workflows here so that many workflows share
+# one event loop instead of holding one OS thread each for the whole run.
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared background event loop, starting it on first use"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name="workflow-event-loop", daemon=True)
+            thread.start()
+        return _loop
+
+
+def run_coroutine(coroutine):
+    """Run a coroutine on the shared event loop and block until it returns"""
+    return asyncio.run_coroutine_threadsafe(coroutine, get_event_loop()).result()
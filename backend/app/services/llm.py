@@ -5,44 +5,526 @@ from langchain_core.messages import SystemMessage
 # https://python.langchain.com/v0.1/docs/modules/model_io/output_parsers/types/json/
 from langchain_core.output_parsers import JsonOutputParser
 
+import asyncio
+import json
 import logging
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
 import os
+import httpx
+import redis
 
 from loguru import logger
 
+from app.core.config import cfg
+from app.models.budget import Budget
+from app.services.llm_cache import get_response_cache, get_cache_key, dump_message, load_message
+from app.services.partial_json import PartialJsonParser
+
+
+# Process-wide LLM client registry. Every agent borrows the same chat model and
+# the same pooled HTTP clients, so TCP/TLS connections are reused across agents.
+_registry_lock = threading.Lock()
+_chat_models = {}
+_http_client = None
+# The connection pool of an async client belongs to the event loop it is used on, so async code
+# gets the chat models and the async client of its running loop
+_loop_chat_models = weakref.WeakKeyDictionary()
+_http_async_clients = weakref.WeakKeyDictionary()
+
+# Shared pool for running the tool calls of one model turn concurrently
+_tool_executor = ThreadPoolExecutor(max_workers=cfg.TOOL_CALL_MAX_WORKERS, thread_name_prefix="tool-call")
+
+# Budget of the request the current context is working on
+_budget: ContextVar[Budget] = ContextVar("budget", default=None)
+_budget_lock = threading.Lock()
+
+# Input tokens per agent that the provider served from its prompt prefix cache
+_prompt_cache_stats: Dict[str, Dict[str, int]] = {}
+# Counters not yet added to the ones all processes share in Redis
+_unpublished_prompt_cache_stats: Dict[str, Dict[str, int]] = {}
+_prompt_cache_lock = threading.Lock()
+PROMPT_CACHE_STATS_KEY = "prompt-cache:stats"
+
+
+@contextmanager
+def track_budget(budget: Budget):
+    """Charge the token usage and latency of every LLM call made in this context to the budget"""
+    token = _budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _budget.reset(token)
+
+
+def _record_usage(response, started_at: float, agent: str = None):
+    usage = getattr(response, "usage_metadata", None) or {}
+    input_tokens = usage.get("input_tokens", 0)
+    cached_tokens = (usage.get("input_token_details") or {}).get("cache_read", 0)
+    with _prompt_cache_lock:
+        for stats_by_agent in (_prompt_cache_stats, _unpublished_prompt_cache_stats):
+            _add_prompt_cache_usage(stats_by_agent, agent or "unknown", 1, input_tokens, cached_tokens)
+
+    budget = _budget.get()
+    if budget is None:
+        return
+    with _budget_lock:
+        budget.tokens_used += usage.get("total_tokens", 0)
+        budget.cached_tokens += cached_tokens
+        budget.llm_calls += 1
+        budget.llm_seconds += time.monotonic() - started_at
+
+
+def _add_prompt_cache_usage(stats_by_agent: Dict[str, Dict[str, int]], agent: str, llm_calls: int,
+                            input_tokens: int, cached_tokens: int):
+    stats = stats_by_agent.setdefault(agent, {"llm_calls": 0, "input_tokens": 0, "cached_tokens": 0})
+    stats["llm_calls"] += llm_calls
+    stats["input_tokens"] += input_tokens
+    stats["cached_tokens"] += cached_tokens
+
+
+@lru_cache(maxsize=None)
+def _get_prompt_cache_stats_client() -> Optional[redis.Redis]:
+    url = cfg.PROMPT_CACHE_STATS_REDIS_URL
+    return redis.Redis.from_url(url, decode_responses=True) if url else None
+
+
+def publish_prompt_cache_stats():
+    """Add the counters gathered since the last call to the ones the API and the workers share in Redis"""
+    global _unpublished_prompt_cache_stats
+    client = _get_prompt_cache_stats_client()
+    if client is None:
+        return
+    with _prompt_cache_lock:
+        unpublished, _unpublished_prompt_cache_stats = _unpublished_prompt_cache_stats, {}
+    if not unpublished:
+        return
+    try:
+        pipeline = client.pipeline(transaction=False)
+        for agent, stats in unpublished.items():
+            for counter, value in stats.items():
+                pipeline.hincrby(PROMPT_CACHE_STATS_KEY, f"{agent}:{counter}", value)
+        pipeline.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Publishing prompt cache stats failed: {e}")
+        # Kept for the next call
+        with _prompt_cache_lock:
+            for agent, stats in unpublished.items():
+                _add_prompt_cache_usage(_unpublished_prompt_cache_stats, agent, **stats)
+
+
+def get_prompt_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Return the input tokens and the tokens read from the provider's prompt cache per agent,
+    of all processes when they are shared through Redis and of this process otherwise
+    """
+    stats_by_agent = None
+    client = _get_prompt_cache_stats_client()
+    if client is not None:
+        try:
+            shared = client.hgetall(PROMPT_CACHE_STATS_KEY)
+            stats_by_agent = {}
+            for field, value in shared.items():
+                agent, counter = field.rsplit(":", 1)
+                stats_by_agent.setdefault(agent, {"llm_calls": 0, "input_tokens": 0, "cached_tokens": 0})[counter] = int(value)
+        except redis.RedisError as e:
+            logger.warning(f"Prompt cache stats lookup failed: {e}")
+            stats_by_agent = None
+    if stats_by_agent is None:
+        with _prompt_cache_lock:
+            stats_by_agent = {agent: dict(stats) for agent, stats in _prompt_cache_stats.items()}
+    return {
+        agent: {**stats, "hit_rate": stats["cached_tokens"] / stats["input_tokens"] if stats["input_tokens"] > 0 else 0.0}
+        for agent, stats in stats_by_agent.items()
+    }
+
+
+def _get_pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=cfg.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=cfg.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=cfg.LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+def get_http_client() -> httpx.Client:
+    """Return the shared, connection-pooled HTTP client used for LLM calls"""
+    global _http_client
+    with _registry_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(limits=_get_pool_limits(), timeout=None)
+        return _http_client
+
+
+def get_http_async_client() -> httpx.AsyncClient:
+    """Return the connection-pooled async HTTP client of the running event loop used for LLM calls"""
+    loop = asyncio.get_running_loop()
+    with _registry_lock:
+        if loop not in _http_async_clients:
+            _http_async_clients[loop] = httpx.AsyncClient(limits=_get_pool_limits(), timeout=None)
+        return _http_async_clients[loop]
+
+
+def get_chat_model(model: str = None, temperature: float = 0) -> ChatOpenAI:
+    """Return the shared chat model for the given model name and temperature, the one of the running event loop in async code"""
+    model = model or cfg.LLM_MODEL
+    key = (model, temperature)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    chat_model = (_chat_models if loop is None else _loop_chat_models.get(loop, {})).get(key)
+    if chat_model is not None:
+        return chat_model
+
+    http_client = get_http_client()
+    # Sync code never uses the async client, the model keeps the default one
+    http_async_client = get_http_async_client() if loop is not None else None
+    with _registry_lock:
+        chat_models = _chat_models if loop is None else _loop_chat_models.setdefault(loop, {})
+        if key not in chat_models:
+            load_dotenv()
+            OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+            if OPENAI_API_KEY is None:
+                raise ValueError("OPENAI_API_KEY environment variable is not set")
+            chat_models[key] = ChatOpenAI(
+                model=model,
+                temperature=temperature,
+                max_tokens=None,
+                timeout=None,
+                max_retries=2,
+                stream_usage=True,
+                api_key=OPENAI_API_KEY,
+                http_client=http_client,
+                http_async_client=http_async_client,
+            )
+        return chat_models[key]
+
+
+def _log_abandoned_tool_call(tool_name: str, future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Tool call {tool_name} of a failed model turn failed: {future.exception()}")
 
 
 class LLMService:
-    def __init__(self):
-        self.model = self._build_model()
+    def __init__(self, agent: Any = None):
+        # The agent the usage of the calls is reported for
+        self.agent = agent
+        # Fails early when the model cannot be created, e.g. without an API key
+        get_chat_model()
         self.json_output_parser = JsonOutputParser()
 
-    def _build_model(self):
-        load_dotenv()
-        OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-        if OPENAI_API_KEY is None:
-            raise ValueError("OPENAI_API_KEY environment variable is not set")
-        return ChatOpenAI(
-            model="gpt-4o",
-            temperature=0,
-            max_tokens=None,
-            timeout=None,
-            max_retries=2,
-            api_key=OPENAI_API_KEY,
-        )
-        self.json_output_parser = JsonOutputParser()
+    @property
+    def model(self) -> ChatOpenAI:
+        # Looked up on every call, async calls need the chat model of their event loop
+        return get_chat_model()
 
-    def invoke(self, prompt: ChatPromptTemplate, is_response_json=True, tools=[], **kwargs):
+    def invoke(self, prompt: ChatPromptTemplate, is_response_json=True, tools=[], read_only_tools=(), use_cache=True, **kwargs):
         if len(tools) > 0:
-            return self.invoke_with_tools(prompt=prompt, tools=tools, **kwargs)
+            return self.invoke_with_tools(prompt=prompt, tools=tools, read_only_tools=read_only_tools, **kwargs)
 
         messages = prompt.invoke(**kwargs)
-        response = self.model.invoke(messages)
-        
-        response_content = response.content
+        response = self._call_model(self.model, messages, use_cache=use_cache)
+
+        return self._parse_response(response.content, is_response_json)
+
+    async def ainvoke(self, prompt: ChatPromptTemplate, is_response_json=True, tools=[], read_only_tools=(), use_cache=True, **kwargs):
+        if len(tools) > 0:
+            return await self.ainvoke_with_tools(prompt=prompt, tools=tools, read_only_tools=read_only_tools, **kwargs)
+
+        messages = await prompt.ainvoke(**kwargs)
+        response = await self._acall_model(self.model, messages, use_cache=use_cache)
+
+        return self._parse_response(response.content, is_response_json)
+
+    def stream(self, prompt: ChatPromptTemplate, on_partial, **kwargs):
+        """
+            Invoke LLM streaming its JSON response, on_partial is called with every partial parse of the response
+        """
+        messages = prompt.invoke(**kwargs)
+        cache_key, response = self._get_cached_response(messages)
+        if response is not None:
+            self._notify_partial(PartialJsonParser().feed(response.content), on_partial)
+            return self._parse_response(response.content)
+
+        started_at = time.monotonic()
+        # The response is parsed as it streams in, not again as a whole for every chunk
+        parser = PartialJsonParser()
+        for chunk in self.model.stream(messages):
+            response = chunk if response is None else response + chunk
+            if chunk.content:
+                self._notify_partial(parser.feed(chunk.content), on_partial)
+        _record_usage(response, started_at, self._get_agent_name())
+        self._set_cached_response(cache_key, response)
+
+        return self._parse_response(response.content if response is not None else "")
+
+    async def astream(self, prompt: ChatPromptTemplate, on_partial, **kwargs):
+        """
+            Invoke LLM streaming its JSON response asynchronously, on_partial is called with every partial parse of the response
+        """
+        messages = await prompt.ainvoke(**kwargs)
+        cache_key, response = await self._aget_cached_response(messages)
+        if response is not None:
+            self._notify_partial(PartialJsonParser().feed(response.content), on_partial)
+            return self._parse_response(response.content)
+
+        started_at = time.monotonic()
+        # The response is parsed as it streams in, not again as a whole for every chunk
+        parser = PartialJsonParser()
+        async for chunk in self.model.astream(messages):
+            response = chunk if response is None else response + chunk
+            if chunk.content:
+                self._notify_partial(parser.feed(chunk.content), on_partial)
+        _record_usage(response, started_at, self._get_agent_name())
+        await self._aset_cached_response(cache_key, response)
+
+        return self._parse_response(response.content if response is not None else "")
+
+    def invoke_with_tools(self, prompt: ChatPromptTemplate, tools=[], read_only_tools=(), **kwargs):
+        """
+            Invoke LLM tool calling loop
+        """
+        tools_dict = {tool.name: tool for tool in tools}
+        messages = prompt.invoke(**kwargs)
+        model_with_tools = self.model.bind_tools(tools)
+        # Responses are only cached if none of the bound tools has side effects
+        use_cache = all(tool.name in read_only_tools for tool in tools)
+
+        # Run all tool calls of the turn concurrently, responses keep the call order
+        def start_tool_call(tool, tool_args):
+            return _tool_executor.submit(tool.invoke, tool_args)
+
+        if cfg.TOOL_CALL_STREAMING:
+            tool_calls = self._stream_tool_calls(model_with_tools, messages, tools_dict, start_tool_call, use_cache)
+        else:
+            response = self._call_model(model_with_tools, messages, tools, use_cache)
+            tool_calls = [(tool_call, tool, tool_args, start_tool_call(tool, tool_args))
+                          for tool_call, tool, tool_args in self._get_tool_calls(response, tools_dict)]
+        # The timeout applies per call, counted from the moment all calls were started
+        deadline = time.monotonic() + cfg.TOOL_CALL_TIMEOUT
 
+        tool_responses = []
+        for tool_call, _, tool_args, future in tool_calls:
+            try:
+                tool_response = future.result(timeout=max(0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                logger.error(f"Tool call {tool_call['name']} timed out after {cfg.TOOL_CALL_TIMEOUT}s")
+                tool_response = f"Error: timed out after {cfg.TOOL_CALL_TIMEOUT} seconds"
+            except Exception as e:
+                logger.error(f"Tool call {tool_call['name']} failed: {e}")
+                tool_response = f"Error: {e}"
+            tool_responses.append({"name": tool_call["name"], "args": tool_args, "response": tool_response})
+
+        prompt = self._add_tool_responses(prompt, tool_responses)
+        return self.invoke(prompt, use_cache=use_cache, **kwargs)
+
+    async def ainvoke_with_tools(self, prompt: ChatPromptTemplate, tools=[], read_only_tools=(), **kwargs):
+        """
+            Invoke LLM tool calling loop asynchronously
+        """
+        tools_dict = {tool.name: tool for tool in tools}
+        messages = await prompt.ainvoke(**kwargs)
+        model_with_tools = self.model.bind_tools(tools)
+        # Responses are only cached if none of the bound tools has side effects
+        use_cache = all(tool.name in read_only_tools for tool in tools)
+
+        # Run all tool calls of the turn concurrently, responses keep the call order
+        def start_tool_call(tool, tool_args):
+            return asyncio.ensure_future(asyncio.wait_for(tool.ainvoke(tool_args), timeout=cfg.TOOL_CALL_TIMEOUT))
+
+        if cfg.TOOL_CALL_STREAMING:
+            tool_calls = await self._astream_tool_calls(model_with_tools, messages, tools_dict, start_tool_call, use_cache)
+        else:
+            response = await self._acall_model(model_with_tools, messages, tools, use_cache)
+            tool_calls = [(tool_call, tool, tool_args, start_tool_call(tool, tool_args))
+                          for tool_call, tool, tool_args in self._get_tool_calls(response, tools_dict)]
+        results = await asyncio.gather(*[task for _, _, _, task in tool_calls], return_exceptions=True)
+
+        tool_responses = []
+        for (tool_call, _, tool_args, _), tool_response in zip(tool_calls, results):
+            if isinstance(tool_response, asyncio.TimeoutError):
+                logger.error(f"Tool call {tool_call['name']} timed out after {cfg.TOOL_CALL_TIMEOUT}s")
+                tool_response = f"Error: timed out after {cfg.TOOL_CALL_TIMEOUT} seconds"
+            elif isinstance(tool_response, Exception):
+                logger.error(f"Tool call {tool_call['name']} failed: {tool_response}")
+                tool_response = f"Error: {tool_response}"
+            tool_responses.append({"name": tool_call["name"], "args": tool_args, "response": tool_response})
+
+        prompt = self._add_tool_responses(prompt, tool_responses)
+        return await self.ainvoke(prompt, use_cache=use_cache, **kwargs)
+
+    def _stream_tool_calls(self, model, messages, tools_dict, start_tool_call, use_cache=True):
+        """
+            Stream the model response and start every tool call as soon as its arguments are complete,
+            so the tools run while the model is still generating the remaining calls
+        """
+        started = {}
+        cache_key, response = self._get_cached_response(messages, tools_dict.values(), use_cache)
+        if response is not None:
+            return self._collect_tool_calls(response, tools_dict, started, start_tool_call)
+
+        started_at = time.monotonic()
+        try:
+            for chunk in model.stream(messages):
+                response = chunk if response is None else response + chunk
+                if chunk.tool_call_chunks:
+                    self._start_complete_tool_calls(response, tools_dict, started, start_tool_call)
+        except BaseException:
+            for tool_call, _, _, future in started.values():
+                # Calls that are already running cannot be cancelled, their errors are logged instead of lost
+                if not future.cancel():
+                    future.add_done_callback(lambda future, name=tool_call["name"]: _log_abandoned_tool_call(name, future))
+            raise
+        _record_usage(response, started_at, self._get_agent_name())
+        self._set_cached_response(cache_key, response)
+
+        return self._collect_tool_calls(response, tools_dict, started, start_tool_call)
+
+    async def _astream_tool_calls(self, model, messages, tools_dict, start_tool_call, use_cache=True):
+        """
+            Stream the model response asynchronously and start every tool call as soon as its arguments are complete
+        """
+        started = {}
+        cache_key, response = await self._aget_cached_response(messages, tools_dict.values(), use_cache)
+        if response is not None:
+            return self._collect_tool_calls(response, tools_dict, started, start_tool_call)
+
+        started_at = time.monotonic()
+        try:
+            async for chunk in model.astream(messages):
+                response = chunk if response is None else response + chunk
+                if chunk.tool_call_chunks:
+                    self._start_complete_tool_calls(response, tools_dict, started, start_tool_call)
+        except BaseException:
+            for _, _, _, task in started.values():
+                task.cancel()
+            raise
+        _record_usage(response, started_at, self._get_agent_name())
+        await self._aset_cached_response(cache_key, response)
+
+        return self._collect_tool_calls(response, tools_dict, started, start_tool_call)
+
+    def _start_complete_tool_calls(self, response, tools_dict, started, start_tool_call):
+        """
+            Start the tool calls of a partial response whose arguments have been streamed completely
+        """
+        for tool_call_chunk in response.tool_call_chunks:
+            tool_call_id = tool_call_chunk.get("id")
+            if tool_call_id is None or tool_call_id in started or tool_call_chunk.get("name") not in tools_dict:
+                continue
+            try:
+                args = json.loads(tool_call_chunk.get("args") or "")
+            except json.JSONDecodeError:
+                # The arguments are still being streamed
+                continue
+            if not isinstance(args, dict):
+                continue
+
+            tool_call = {"name": tool_call_chunk["name"], "args": args, "id": tool_call_id}
+            logger.info(f"Tool call: {tool_call}")
+            selected_tool = tools_dict[tool_call["name"]]
+            tool_args = self._get_tool_args(selected_tool, tool_call)
+            started[tool_call_id] = (tool_call, selected_tool, tool_args, start_tool_call(selected_tool, tool_args))
+
+    def _collect_tool_calls(self, response, tools_dict, started, start_tool_call):
+        """
+            Return the (tool_call, tool, tool_args, future) tuples of the final response in call order,
+            starting the calls that could not be started while streaming
+        """
+        if response is None:
+            return []
+
+        tool_calls = []
+        for tool_call in response.tool_calls or []:
+            if tool_call.get("id") in started:
+                tool_calls.append(started[tool_call["id"]])
+                continue
+            logger.info(f"Tool call: {tool_call}")
+            selected_tool = tools_dict[tool_call["name"]]
+            tool_args = self._get_tool_args(selected_tool, tool_call)
+            tool_calls.append((tool_call, selected_tool, tool_args, start_tool_call(selected_tool, tool_args)))
+        return tool_calls
+
+    def _get_agent_name(self):
+        return getattr(self.agent, "name", None)
+
+    def _notify_partial(self, partial, on_partial):
+        if partial is None:
+            # Not enough of the response to parse yet
+            return
+        try:
+            on_partial(partial)
+        except Exception as e:
+            logger.warning(f"Error handling partial response: {e}")
+
+    def _get_cache_key(self, messages, tools=(), use_cache=True):
+        """Return the response cache key of a model call, None if the call must not be cached"""
+        if not use_cache or get_response_cache() is None:
+            return None
+        return get_cache_key(self.model.model_name, self.model.temperature, messages.to_messages(),
+                             [tool.name for tool in tools])
+
+    def _get_cached_response(self, messages, tools=(), use_cache=True):
+        cache_key = self._get_cache_key(messages, tools, use_cache)
+        if cache_key is None:
+            return None, None
+        value = get_response_cache().get(cache_key)
+        if value is None:
+            return cache_key, None
+        logger.info("Using cached LLM response")
+        return cache_key, load_message(value)
+
+    async def _aget_cached_response(self, messages, tools=(), use_cache=True):
+        cache_key = self._get_cache_key(messages, tools, use_cache)
+        if cache_key is None:
+            return None, None
+        value = await get_response_cache().aget(cache_key)
+        if value is None:
+            return cache_key, None
+        logger.info("Using cached LLM response")
+        return cache_key, load_message(value)
+
+    def _set_cached_response(self, cache_key, response):
+        if cache_key is not None and response is not None:
+            get_response_cache().set(cache_key, dump_message(response))
+
+    async def _aset_cached_response(self, cache_key, response):
+        if cache_key is not None and response is not None:
+            await get_response_cache().aset(cache_key, dump_message(response))
+
+    def _call_model(self, model, messages, tools=(), use_cache=True):
+        cache_key, response = self._get_cached_response(messages, tools, use_cache)
+        if response is not None:
+            return response
+
+        started_at = time.monotonic()
+        response = model.invoke(messages)
+        _record_usage(response, started_at, self._get_agent_name())
+        self._set_cached_response(cache_key, response)
+        return response
+
+    async def _acall_model(self, model, messages, tools=(), use_cache=True):
+        cache_key, response = await self._aget_cached_response(messages, tools, use_cache)
+        if response is not None:
+            return response
+
+        started_at = time.monotonic()
+        response = await model.ainvoke(messages)
+        _record_usage(response, started_at, self._get_agent_name())
+        await self._aset_cached_response(cache_key, response)
+        return response
+
+    def _parse_response(self, response_content, is_response_json=True):
         if is_response_json:
             try:
                 return self.json_output_parser.parse(response_content)
@@ -52,49 +534,47 @@ class LLMService:
                 return {}
         
         return response_content
-    
-    def invoke_with_tools(self, prompt: ChatPromptTemplate, tools=[], **kwargs):
+
+    def _get_tool_calls(self, response, tools_dict):
         """
-            Invoke LLM tool calling loop
+            Resolve the tool calls of a model response to (tool_call, tool, tool_args) tuples
         """
-        tools_dict = {tool.name: tool for tool in tools}
-        messages = prompt.invoke(**kwargs)
-        model_with_tools = self.model.bind_tools(tools)
-        response = model_with_tools.invoke(messages)
+        tool_calls = []
+        for tool_call in response.tool_calls or []:
+            logger.info(f"Tool call: {tool_call}")
+            selected_tool = tools_dict[tool_call["name"]]
+            tool_args = self._get_tool_args(selected_tool, tool_call)
+            logger.info(f"Tool args: {tool_args}")
+            tool_calls.append((tool_call, selected_tool, tool_args))
+
+        return tool_calls
+
+    def _get_tool_args(self, selected_tool, tool_call):
+        # Get the tool arguments
+        tool_args = {}
         
-        tool_responses = []
-        if response.tool_calls:
-            for tool_call in response.tool_calls:
-                logger.info(f"Tool call: {tool_call}")
-                selected_tool = tools_dict[tool_call["name"]]
-                
-                # Get the tool arguments
-                tool_args = {}
-                
-                # If the tool has an args_schema, use it to map the arguments
-                if hasattr(selected_tool, 'args_schema') and selected_tool.args_schema:
-                    # Get the argument names from the schema
-                    arg_names = list(selected_tool.args_schema.keys())
-                    
-                    # Map the tool call arguments to the function arguments
-                    for i, (key, value) in enumerate(tool_call["args"].items()):
-                        if key.startswith("__") and key.endswith("__"):
-                            # Convert __arg1 to 0, __arg2 to 1, etc.
-                            arg_index = int(key[2:-2]) - 1
-                            if arg_index < len(arg_names):
-                                tool_args[arg_names[arg_index]] = value
-                        else:
-                            # If the argument name doesn't have the __ prefix and __ suffix, use it as is
-                            tool_args[key] = value
+        # If the tool has an args_schema, use it to map the arguments
+        if hasattr(selected_tool, 'args_schema') and selected_tool.args_schema:
+            # Get the argument names from the schema
+            arg_names = list(selected_tool.args_schema.keys())
+            
+            # Map the tool call arguments to the function arguments
+            for i, (key, value) in enumerate(tool_call["args"].items()):
+                if key.startswith("__") and key.endswith("__"):
+                    # Convert __arg1 to 0, __arg2 to 1, etc.
+                    arg_index = int(key[2:-2]) - 1
+                    if arg_index < len(arg_names):
+                        tool_args[arg_names[arg_index]] = value
                 else:
-                    # If the tool doesn't have an args_schema, use the arguments as is
-                    tool_args = tool_call["args"]
-                
-                logger.info(f"Tool args: {tool_args}")
-                
-                tool_response = selected_tool.invoke(tool_args)
-                tool_responses.append({"name": tool_call["name"], "args": tool_args, "response": tool_response})
-        
+                    # If the argument name doesn't have the __ prefix and __ suffix, use it as is
+                    tool_args[key] = value
+        else:
+            # If the tool doesn't have an args_schema, use the arguments as is
+            tool_args = tool_call["args"]
+
+        return tool_args
+
+    def _add_tool_responses(self, prompt: ChatPromptTemplate, tool_responses):
         # Add tool responses to the original prompt
         for tool_response in tool_responses:
             # Convert the response to a string and escape curly braces
@@ -104,8 +584,8 @@ class LLMService:
                 prompt = prompt[:-1] + [SystemMessage(content=tool_message)] + prompt[-1]
             else:
                 prompt = prompt + [SystemMessage(content=tool_message)]
-        
-        return self.invoke(prompt, **kwargs)
+
+        return prompt
 
 
 class LLMServiceMock:
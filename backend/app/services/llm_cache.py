@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+import redis
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from loguru import logger
+
+from app.core.config import cfg
+
+
+def get_cache_key(model: str, temperature: float, messages: List[BaseMessage], bound: Optional[Sequence[str]] = None) -> str:
+    """Hash the model, temperature, fully rendered messages and bound tools of an LLM call"""
+    payload = json.dumps(
+        {
+            "model": model,
+            "temperature": temperature,
+            "messages": [message_to_dict(message) for message in messages],
+            "bound": bound or [],
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def dump_message(message: BaseMessage) -> str:
+    return json.dumps(message_to_dict(message), default=str)
+
+
+def load_message(value: str) -> BaseMessage:
+    return messages_from_dict([json.loads(value)])[0]
+
+
+class ResponseCache(ABC):
+    """
+    Cache of serialized LLM responses. Subclasses implement get and set, the async variants
+    run them in a thread unless the cache never blocks.
+    """
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: str):
+        pass
+
+    async def aget(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: str):
+        await asyncio.to_thread(self.set, key, value)
+
+
+class MemoryResponseCache(ResponseCache):
+    """In-process LRU cache with a TTL per entry"""
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if time.monotonic() > expires_at:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    async def aget(self, key: str) -> Optional[str]:
+        return self.get(key)
+
+    async def aset(self, key: str, value: str):
+        self.set(key, value)
+
+
+class RedisResponseCache(ResponseCache):
+    """Cache shared by all processes, entries expire in Redis after the TTL"""
+    key_prefix = "llm-cache:"
+
+    def __init__(self, url: str, ttl: float):
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            return self.client.get(self.key_prefix + key)
+        except redis.RedisError as e:
+            logger.warning(f"LLM cache lookup failed: {e}")
+            return None
+
+    def set(self, key: str, value: str):
+        try:
+            self.client.set(self.key_prefix + key, value, ex=max(1, int(self.ttl)))
+        except redis.RedisError as e:
+            logger.warning(f"LLM cache store failed: {e}")
+
+
+class TieredResponseCache(ResponseCache):
+    """
+    Looks up the tiers in order and fills the faster tiers on a hit in a slower one.
+    Values larger than max_value_bytes are not cached.
+    """
+    def __init__(self, tiers: List[ResponseCache], max_value_bytes: int):
+        self.tiers = tiers
+        self.max_value_bytes = max_value_bytes
+
+    def get(self, key: str) -> Optional[str]:
+        for position, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                for faster_tier in self.tiers[:position]:
+                    faster_tier.set(key, value)
+                return value
+        return None
+
+    def set(self, key: str, value: str):
+        if len(value.encode()) > self.max_value_bytes:
+            return
+        for tier in self.tiers:
+            tier.set(key, value)
+
+    async def aget(self, key: str) -> Optional[str]:
+        for position, tier in enumerate(self.tiers):
+            value = await tier.aget(key)
+            if value is not None:
+                for faster_tier in self.tiers[:position]:
+                    await faster_tier.aset(key, value)
+                return value
+        return None
+
+    async def aset(self, key: str, value: str):
+        if len(value.encode()) > self.max_value_bytes:
+            return
+        for tier in self.tiers:
+            await tier.aset(key, value)
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the process-wide LLM response cache configured by LLM_CACHE, None if caching is off"""
+    global _response_cache
+    if cfg.LLM_CACHE == "off":
+        return None
+    with _response_cache_lock:
+        if _response_cache is None:
+            tiers = [MemoryResponseCache(cfg.LLM_CACHE_MAX_ENTRIES, cfg.LLM_CACHE_TTL)]
+            if cfg.LLM_CACHE == "redis":
+                tiers.append(RedisResponseCache(cfg.LLM_CACHE_REDIS_URL, cfg.LLM_CACHE_TTL))
+            elif cfg.LLM_CACHE != "memory":
+                raise ValueError(f"Unknown LLM_CACHE: {cfg.LLM_CACHE}")
+            _response_cache = TieredResponseCache(tiers, cfg.LLM_CACHE_MAX_VALUE_BYTES)
+        return _response_cache
@@ -1,5 +1,5 @@
 from app.models.state import State
-from app.models.blackboard import Blackboard, Plan, History, Status
+from app.models.blackboard import Blackboard, Plan, History, Status, Step
 from langgraph.graph import StateGraph, START, END
 from IPython.display import Image
 from app.agents.planner import PlannerAgent
@@ -16,21 +16,33 @@ from app.agents.edge_agents.shopping import ShoppingAgent
 from app.agents.edge_agents.room_temperature import RoomTemperatureAgent
 from app.agents.edge_agents.emergency import EmergencyAgent
 from app.agents.edge_agents.security import SecurityAgent
-from typing import Dict, Any
+from app.agents.edge_agents.fused import FusedEdgeAgent
+from app.services.prefetch import SpeculativePrefetcher, release_prefetch_cache
+from app.services.plan_cache import get_plan_cache
+from app.services.llm import track_budget
+from app.core.config import cfg
+from typing import Dict, Any, List, Tuple, Callable, Union
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.runnables import RunnableLambda
+import asyncio
+import contextvars
 
 from loguru import logger
 
 
 class OrchestrationService:
+    max_iterations = 5  # Maximum number of iterations to prevent infinite loops
+    stream_summary = False  # Stream the final summary of the orchestration agent while it is generated
+
     def __init__(self):
         self.router_builder = StateGraph(State)
         self.workflow = None
-        self.iteration_count = 0
-        self.max_iterations = 5  # Maximum number of iterations to prevent infinite loops
 
         # Initialize agents
         self.planner_agent = PlannerAgent()
         self.orchestration_agent = OrchestrationAgent()
+        room_temperature_agent = RoomTemperatureAgent()
         self.edge_agents = {
             "window": WindowAgent(),
             "light": LightAgent(),
@@ -41,83 +53,409 @@ class OrchestrationService:
             "calendar": CalendarAgent(),
             "email": EmailAgent(),
             "shopping": ShoppingAgent(),
-            "room_temperature": RoomTemperatureAgent(),
-            "humidity": RoomTemperatureAgent(),  # Alias for humidity requests
+            "room_temperature": room_temperature_agent,
+            "humidity": room_temperature_agent,  # Alias for humidity requests
             "emergency": EmergencyAgent(),
             "security": SecurityAgent()
         }
 
+        # Bounded worker pool shared by all requests for concurrent edge agent execution
+        self.edge_executor = ThreadPoolExecutor(
+            max_workers=cfg.EDGE_AGENTS_MAX_WORKERS,
+            thread_name_prefix="edge-agent"
+        )
+        # Fused agents are built once per combination of edge agents
+        self.fused_agents = {}
+
+        self.prefetcher = SpeculativePrefetcher(self.edge_agents)
+
     def generate_workflow(self) -> StateGraph:
-        # Add nodes for each step in the pipeline
-        self.router_builder.add_node("get_first_plan", self._get_first_plan)
-        self.router_builder.add_node("get_plan", self._get_plan)
-        self.router_builder.add_node("execute_edge_agents", self._execute_edge_agents)
+        # Add nodes for each step in the pipeline, every node has a native async variant
+        # so the same compiled workflow serves both invoke and ainvoke
+        self.router_builder.add_node("get_first_plan", self._budgeted_node(self._get_first_plan, self._aget_first_plan))
+        self.router_builder.add_node("get_plan", self._budgeted_node(self._get_plan, self._aget_plan))
+        self.router_builder.add_node("execute_edge_agents",
+                                     self._budgeted_node(self._execute_edge_agents, self._aexecute_edge_agents,
+                                                         cut_off=False))
         self.router_builder.add_node("check_completion", self._check_completion)
+        self.router_builder.add_node("finalize", self._finalize)
 
-        # Add edges to connect nodes
+        # Add edges to connect nodes, the budget is checked before every LLM node
         self.router_builder.add_edge(START, "get_first_plan")
-        self.router_builder.add_edge("get_first_plan", "execute_edge_agents")
-        self.router_builder.add_edge("execute_edge_agents", "get_plan")
+        self.router_builder.add_conditional_edges(
+            "get_first_plan",
+            self._has_budget,
+            {
+                True: "execute_edge_agents",
+                False: "finalize"
+            }
+        )
+        self.router_builder.add_conditional_edges(
+            "execute_edge_agents",
+            self._has_budget,
+            {
+                True: "get_plan",
+                False: "finalize"
+            }
+        )
         self.router_builder.add_edge("get_plan", "check_completion")
         self.router_builder.add_conditional_edges(
             "check_completion",
             self._should_end,
             {
-                True: END,
+                True: "finalize",
                 False: "execute_edge_agents"
             }
         )
-    
+        self.router_builder.add_edge("finalize", END)
+
+    def _budgeted_node(self, func: Callable, afunc: Callable, cut_off: bool = True) -> RunnableLambda:
+        """
+        Build a node that charges its LLM calls to the request budget.
+        With cut_off, the async variant is also cancelled at the deadline, the sync one can only be checked before
+        it starts. Nodes that run actions are never cut off, the actions they started must reach the history;
+        they check the budget between their steps instead.
+        """
+        def node(state: State) -> State:
+            with track_budget(state.budget):
+                return func(state)
+
+        async def anode(state: State) -> State:
+            with track_budget(state.budget):
+                if not cut_off:
+                    return await afunc(state)
+                remaining_time = state.budget.get_remaining_time()
+                try:
+                    return await asyncio.wait_for(afunc(state), timeout=remaining_time)
+                except asyncio.TimeoutError:
+                    logger.warning(f"Deadline reached during {func.__name__}, finalizing with the current history")
+                    state.budget.exhausted = "deadline"
+                    return state
+
+        return RunnableLambda(node, afunc=anode)
+
+    def _has_budget(self, state: State) -> bool:
+        """Conditional edge function to determine if the request can afford another LLM round"""
+        if state.budget.exhausted is not None:
+            return False
+        reason = state.budget.check()
+        if reason is not None:
+            logger.warning(f"Request budget exhausted ({reason}): {state.budget}")
+            return False
+        return True
+
+    def _broadcast_update(self, state: State, agent: str, status: str = "processing"):
+        """Hook called after every node; the base service does not publish progress"""
+        pass
+
+    def _broadcast_summary(self, state: State, summary: str):
+        """Hook called with the final summary so far while it is streamed"""
+        pass
+
+    def _get_summary_callback(self, state: State):
+        if not self.stream_summary:
+            return None
+        return lambda summary: self._broadcast_summary(state, summary)
+
+    def _add_tool_specs(self, agents: List[dict]) -> List[dict]:
+        """Add the tools of every edge agent to the agent catalog so plan steps can call them directly"""
+        return [
+            {**agent, "tools": self.edge_agents[agent["name"]].get_tool_specs()}
+            if agent["name"] in self.edge_agents and "tools" not in agent else agent
+            for agent in agents
+        ]
+
+    def _use_cached_plan(self, state: State) -> bool:
+        """Start from the cached first plan of the same request and agent catalog, return whether there was one"""
+        if not cfg.PLAN_CACHE or state.blackboard.plan.steps or state.blackboard.history.steps:
+            return False
+        blackboard = get_plan_cache().get(state.request, state.agents)
+        if blackboard is None:
+            return False
+        logger.info("Using cached first plan")
+        state.blackboard = blackboard
+        return True
+
+    def _cache_plan(self, state: State):
+        """Cache a first plan that only runs known agents and has not started yet"""
+        if not cfg.PLAN_CACHE:
+            return
+        agent_names = {agent["name"] for agent in state.agents}
+        steps = state.blackboard.plan.steps
+        if steps and all(step.agent in agent_names and step.status == Status.PENDING for step in steps):
+            get_plan_cache().set(state.request, state.agents, state.blackboard)
+
     def _get_first_plan(self, state: State) -> State:
         """Get first plan from planner agent"""
         logger.info("Getting first plan")
 
         # Increment iteration counter
-        self.iteration_count += 1
+        state.iteration_count += 1
+
+        state.agents = self._add_tool_specs(state.agents)
+
+        if self._use_cached_plan(state):
+            self._broadcast_update(state, "planner")
+            return state
+
+        # Start likely read-only tool calls while the planner is running
+        if cfg.SPECULATIVE_PREFETCH:
+            self.prefetcher.start(state.request_id, state.request)
 
         result = self.planner_agent.execute(state)
-        state.blackboard = Blackboard(**result["blackboard"])
+        state.blackboard = state.blackboard.apply_patch(result["patch"])
+        self._cache_plan(state)
+
+        self._broadcast_update(state, "planner")
+        return state
+
+    async def _aget_first_plan(self, state: State) -> State:
+        """Get first plan from planner agent asynchronously"""
+        logger.info("Getting first plan")
+
+        # Increment iteration counter
+        state.iteration_count += 1
+
+        state.agents = self._add_tool_specs(state.agents)
+
+        # The plan cache may look up its shared epoch in Redis
+        if await asyncio.to_thread(self._use_cached_plan, state):
+            self._broadcast_update(state, "planner")
+            return state
+
+        # Start likely read-only tool calls while the planner is running
+        if cfg.SPECULATIVE_PREFETCH:
+            self.prefetcher.start(state.request_id, state.request)
+
+        result = await self.planner_agent.aexecute(state)
+        state.blackboard = state.blackboard.apply_patch(result["patch"])
+        await asyncio.to_thread(self._cache_plan, state)
+
+        self._broadcast_update(state, "planner")
         return state
 
     def _get_plan(self, state: State) -> State:
         """Get plan from orchestration agent"""
-        
+
         # Increment iteration counter
-        self.iteration_count += 1
-        
-        result = self.orchestration_agent.execute(state)
-        state.blackboard = Blackboard(**result["blackboard"])
+        state.iteration_count += 1
+
+        result = self.orchestration_agent.execute(state, self._get_summary_callback(state))
+        state.blackboard = state.blackboard.apply_patch(result["patch"])
+
+        self._broadcast_update(state, "orchestration")
+        return state
+
+    async def _aget_plan(self, state: State) -> State:
+        """Get plan from orchestration agent asynchronously"""
+
+        # Increment iteration counter
+        state.iteration_count += 1
+
+        result = await self.orchestration_agent.aexecute(state, self._get_summary_callback(state))
+        state.blackboard = state.blackboard.apply_patch(result["patch"])
+
+        self._broadcast_update(state, "orchestration")
         return state
 
+    def _get_wave(self, state: State) -> List[Tuple[str, List[Step]]]:
+        """Return the steps that are ready to run grouped by edge agent, critical path first"""
+        ready_steps = [step for step in state.blackboard.get_ready_steps() if step.agent in self.edge_agents]
+        logger.info(f"Ready steps: {ready_steps}")
+
+        # Each edge agent handles all of its ready steps in one execution
+        wave = {}
+        for step in ready_steps:
+            wave.setdefault(step.agent, []).append(step)
+
+        # Agents on the longest dependency chain are started first, ties keep the plan order
+        critical_path_lengths = state.blackboard.get_critical_path_lengths()
+        return sorted(
+            wave.items(),
+            key=lambda item: -max(critical_path_lengths.get(step.id, 1) for step in item[1])
+        )
+
+    def _wave_progressed(self, state: State, wave: List[Tuple[str, List[Step]]]) -> bool:
+        """Check if at least one step of the wave left the pending status"""
+        wave_step_ids = {step.id for _, steps in wave for step in steps}
+        return any(step.id in wave_step_ids and step.status != Status.PENDING
+                   for step in state.blackboard.plan.steps)
+
+    def _get_max_waves(self, state: State) -> int:
+        """Return how many waves the edge agents may run before the orchestration agent takes over"""
+        if cfg.EDGE_AGENTS_MAX_WAVES is not None:
+            return cfg.EDGE_AGENTS_MAX_WAVES
+        # Every wave completes at least one step, so a plan never needs more waves than it has steps
+        return len(state.blackboard.plan.steps)
+
     def _execute_edge_agents(self, state: State) -> State:
-        """Execute edge agents based on the plan"""
-        # Get pending steps from the plan
-        pending_steps = [step for step in state.blackboard.plan.steps 
-                         if step.status == Status.PENDING]
-        logger.info(f"Pending steps: {pending_steps}")
-        
-        # Execute each pending step with the appropriate agent
-        for step in pending_steps:
-            agent_name = step.agent
-            if agent_name in self.edge_agents:
-                agent = self.edge_agents[agent_name]
-                result = agent.execute(state)
-                state.blackboard = Blackboard(**result["blackboard"])
-        
+        """Execute the plan steps in dependency waves until the plan needs the orchestration agent"""
+        max_waves = self._get_max_waves(state)
+        waves = 0
+        while True:
+            wave = self._get_wave(state)
+            if len(wave) == 0 or not self._has_budget(state):
+                break
+            if waves == max_waves:
+                logger.warning(f"Stopped after {waves} waves, steps left for the orchestration agent: {wave}")
+                break
+            waves += 1
+
+            if cfg.EDGE_AGENTS_EXECUTION_MODE == "fused" and len(wave) > 1:
+                self._execute_wave_fused(state, wave)
+            elif cfg.EDGE_AGENTS_EXECUTION_MODE == "concurrent" and len(wave) > 1:
+                self._execute_wave_concurrently(state, wave)
+            else:
+                self._execute_wave(state, wave)
+
+            # Stop when the agents could not complete any step, the orchestration agent takes over
+            if not self._wave_progressed(state, wave):
+                logger.warning(f"No step of the wave was completed: {wave}")
+                break
+
         return state
 
+    def _execute_wave(self, state: State, wave: List[Tuple[str, List[Step]]]):
+        """Execute the agents of a wave one by one, each one sees the previous results"""
+        for agent_name, steps in wave:
+            agent = self.edge_agents[agent_name]
+            result = agent.execute(state, steps)
+            if result is None:
+                continue
+            state.blackboard = state.blackboard.apply_patch(result["patch"], owners=agent_name)
+
+            # Broadcast update after each edge agent
+            self._broadcast_update(state, agent_name)
+
+    def _execute_wave_concurrently(self, state: State, wave: List[Tuple[str, List[Step]]]):
+        """Execute the agents of a wave in parallel and apply their patches in wave order"""
+        logger.info(f"Executing edge agents concurrently: {[agent_name for agent_name, _ in wave]}")
+
+        # Agents work on a snapshot, the blackboard of the state is replaced while they are still running
+        snapshot = state.model_copy()
+        futures = [
+            # Each agent runs in a copy of the node context so its LLM calls are charged to the request budget
+            self.edge_executor.submit(contextvars.copy_context().run, self.edge_agents[agent_name].execute, snapshot, steps)
+            for agent_name, steps in wave
+        ]
+
+        # Patches are applied in submission order so the result is deterministic
+        for (agent_name, _), future in zip(wave, futures):
+            result = future.result()
+            if result is None:
+                continue
+            state.blackboard = state.blackboard.apply_patch(result["patch"], owners=agent_name)
+
+            # Broadcast update after each edge agent
+            self._broadcast_update(state, agent_name)
+
+    def _get_fused_agent(self, agent_names: List[str]) -> FusedEdgeAgent:
+        """Return the fused agent acting for the given edge agents"""
+        key = tuple(agent_names)
+        if key not in self.fused_agents:
+            # Aliases point to the same agent, which must only contribute its tools once
+            agents = list({id(agent): agent for agent in (self.edge_agents[name] for name in agent_names)}.values())
+            self.fused_agents[key] = FusedEdgeAgent(agents)
+        return self.fused_agents[key]
+
+    def _execute_wave_fused(self, state: State, wave: List[Tuple[str, List[Step]]]):
+        """Execute all steps of a wave in a single tool-calling turn of a fused agent"""
+        agent_names = [agent_name for agent_name, _ in wave]
+        logger.info(f"Executing edge agents fused: {agent_names}")
+
+        steps = [step for _, agent_steps in wave for step in agent_steps]
+        result = self._get_fused_agent(agent_names).execute(state, steps)
+        if result is None:
+            return
+        state.blackboard = state.blackboard.apply_patch(result["patch"], owners=agent_names)
+
+        self._broadcast_update(state, ", ".join(agent_names))
+
+    async def _aexecute_edge_agents(self, state: State) -> State:
+        """Execute the plan steps in dependency waves asynchronously"""
+        max_waves = self._get_max_waves(state)
+        waves = 0
+        while True:
+            wave = self._get_wave(state)
+            if len(wave) == 0 or not self._has_budget(state):
+                break
+            if waves == max_waves:
+                logger.warning(f"Stopped after {waves} waves, steps left for the orchestration agent: {wave}")
+                break
+            waves += 1
+
+            if cfg.EDGE_AGENTS_EXECUTION_MODE == "fused" and len(wave) > 1:
+                await self._aexecute_wave_fused(state, wave)
+            elif cfg.EDGE_AGENTS_EXECUTION_MODE == "concurrent" and len(wave) > 1:
+                await self._aexecute_wave_concurrently(state, wave)
+            else:
+                await self._aexecute_wave(state, wave)
+
+            # Stop when the agents could not complete any step, the orchestration agent takes over
+            if not self._wave_progressed(state, wave):
+                logger.warning(f"No step of the wave was completed: {wave}")
+                break
+
+        return state
+
+    async def _aexecute_wave(self, state: State, wave: List[Tuple[str, List[Step]]]):
+        """Execute the agents of a wave one by one asynchronously"""
+        for agent_name, steps in wave:
+            agent = self.edge_agents[agent_name]
+            result = await agent.aexecute(state, steps)
+            if result is None:
+                continue
+            state.blackboard = state.blackboard.apply_patch(result["patch"], owners=agent_name)
+
+            # Broadcast update after each edge agent
+            self._broadcast_update(state, agent_name)
+
+    async def _aexecute_wave_concurrently(self, state: State, wave: List[Tuple[str, List[Step]]]):
+        """Execute the agents of a wave as concurrent tasks and apply their patches in wave order"""
+        logger.info(f"Executing edge agents concurrently: {[agent_name for agent_name, _ in wave]}")
+
+        semaphore = asyncio.Semaphore(cfg.EDGE_AGENTS_MAX_WORKERS)
+
+        async def execute_agent(agent_name: str, steps: List[Step]):
+            async with semaphore:
+                return await self.edge_agents[agent_name].aexecute(state, steps)
+
+        results = await asyncio.gather(*[execute_agent(agent_name, steps) for agent_name, steps in wave])
+
+        # Patches are applied in wave order so the result is deterministic
+        for (agent_name, _), result in zip(wave, results):
+            if result is None:
+                continue
+            state.blackboard = state.blackboard.apply_patch(result["patch"], owners=agent_name)
+
+            # Broadcast update after each edge agent
+            self._broadcast_update(state, agent_name)
+
+    async def _aexecute_wave_fused(self, state: State, wave: List[Tuple[str, List[Step]]]):
+        """Execute all steps of a wave in a single tool-calling turn of a fused agent asynchronously"""
+        agent_names = [agent_name for agent_name, _ in wave]
+        logger.info(f"Executing edge agents fused: {agent_names}")
+
+        steps = [step for _, agent_steps in wave for step in agent_steps]
+        result = await self._get_fused_agent(agent_names).aexecute(state, steps)
+        if result is None:
+            return
+        state.blackboard = state.blackboard.apply_patch(result["patch"], owners=agent_names)
+
+        self._broadcast_update(state, ", ".join(agent_names))
+
     def _check_completion(self, state: State) -> State:
         """Check if we should continue or end the session"""
         logger.info(f"Uncompleted steps: {[step for step in state.blackboard.plan.steps if step.status != Status.COMPLETED]}")
         # Check if all steps in the plan are completed
-        all_completed = all(step.status == Status.COMPLETED 
+        all_completed = all(step.status == Status.COMPLETED
                            for step in state.blackboard.plan.steps)
         logger.info(f"All completed: {all_completed}")
-        
+
         # If all steps are completed, mark the plan as completed
         if all_completed:
             state.blackboard.plan.status = Status.COMPLETED
-        
+
         return state
 
     def _should_end(self, state: State) -> bool:
@@ -125,21 +463,60 @@ class OrchestrationService:
         # Continue if history has an END step and we haven't exceeded max iterations
         logger.info(f"Last step: {state.blackboard.history.steps[-1] if len(state.blackboard.history.steps) > 0 else 'None'}")
         all_completed = all(step.status == Status.COMPLETED for step in state.blackboard.plan.steps)
-        iteration_count_reached = self.iteration_count >= self.max_iterations
-        logger.info(f"All completed: {all_completed}, Iteration count reached: {iteration_count_reached}")
-        logger.info(f"Ended: {all_completed or iteration_count_reached}")
-        return all_completed or iteration_count_reached
+        iteration_count_reached = state.iteration_count >= self.max_iterations
+        budget_exhausted = not self._has_budget(state)
+        logger.info(f"All completed: {all_completed}, Iteration count reached: {iteration_count_reached}, "
+                    f"Budget exhausted: {budget_exhausted}")
+        logger.info(f"Ended: {all_completed or iteration_count_reached or budget_exhausted}")
+        return all_completed or iteration_count_reached or budget_exhausted
+
+    def _finalize(self, state: State) -> State:
+        """Finish the request with the current history and record why it stopped early"""
+        if state.blackboard.plan.status != Status.COMPLETED and state.budget.exhausted is None:
+            state.budget.exhausted = state.budget.check() or "max_iterations"
+
+        logger.info(f"Finalized after {state.budget.get_elapsed_time():.2f}s and {state.budget.tokens_used} tokens, "
+                    f"exhausted: {state.budget.exhausted}")
+
+        # Broadcast completion
+        self._broadcast_update(state, "finalize", status="completed")
+        return state
 
     def compile_workflow(self):
         """Compile the workflow"""
         self.workflow = self.router_builder.compile()
 
+    def _release_request(self, state: Union[State, Dict[str, Any]]):
+        """Free what the request kept for the length of its run, whether it finished or failed"""
+        request_id = state.get("request_id") if isinstance(state, dict) else state.request_id
+        if request_id is not None:
+            release_prefetch_cache(request_id)
+
     def invoke(self, state: State) -> State:
         """Invoke the workflow with initial state"""
-        return self.workflow.invoke(state)
+        try:
+            return self.workflow.invoke(state)
+        finally:
+            self._release_request(state)
+
+    async def ainvoke(self, state: State) -> State:
+        """Invoke the workflow asynchronously with initial state"""
+        try:
+            return await self.workflow.ainvoke(state)
+        finally:
+            self._release_request(state)
 
     def draw_workflow(self):
         """Generate and save workflow visualization"""
         img = Image(self.workflow.get_graph().draw_mermaid_png())
         with open("workflow.png", "wb") as f:
-            f.write(img.data)
\ No newline at end of file
+            f.write(img.data)
+
+
+@lru_cache(maxsize=None)
+def get_orchestration_service() -> OrchestrationService:
+    """Return the process-wide orchestration service with a compiled workflow"""
+    orchestrator = OrchestrationService()
+    orchestrator.generate_workflow()
+    orchestrator.compile_workflow()
+    return orchestrator
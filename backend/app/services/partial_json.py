@@ -0,0 +1,133 @@
+import json
+import re
+from typing import Any, List, Optional
+
+# Characters that end a run of plain string characters
+STRING_SPECIAL = re.compile(r'["\\]')
+# Escape cut off at the end of a partial string
+PARTIAL_ESCAPE = re.compile(r'\\(u[0-9a-fA-F]{0,3})?$')
+
+
+class PartialJsonParser:
+    """
+    Push parser of a JSON value streamed in chunks. Every character is scanned once and the partial value
+    is built up as the chunks arrive, with the string being streamed included so far. Text before the
+    first object or array, e.g. a markdown fence, and text after it are ignored.
+    """
+    def __init__(self):
+        self.root = None
+        self.done = False
+        # Open containers, each with the key its next value is stored under
+        self.stack: List[list] = []
+        # Current token: None, "key", "string" or "scalar", with its raw characters
+        self.token: Optional[str] = None
+        self.raw: List[str] = []
+        self.escape = False
+        # Whether the partial string already has a place in its container
+        self.placed = False
+
+    def feed(self, text: str) -> Any:
+        """Parse the next chunk and return the partial value so far, updated in place, None before it starts"""
+        i = 0
+        while i < len(text) and not self.done:
+            if self.token in ("key", "string"):
+                i = self._feed_string(text, i)
+                continue
+            char = text[i]
+            i += 1
+            if not self.stack and self.root is None and char not in "{[":
+                continue
+            if char in " \t\r\n":
+                self._finish_scalar()
+            elif char in "{[":
+                self._finish_scalar()
+                self._open({} if char == "{" else [])
+            elif char in "}]":
+                self._finish_scalar()
+                self._close()
+            elif char == ",":
+                self._finish_scalar()
+            elif char == ":":
+                continue
+            elif char == '"':
+                self._finish_scalar()
+                container, key = self.stack[-1]
+                self.token = "key" if isinstance(container, dict) and key is None else "string"
+            else:
+                self.token = "scalar"
+                self.raw.append(char)
+
+        if self.token == "string":
+            value = self._decode_partial_string()
+            if value is not None:
+                self._put(value, final=False)
+        return self.root
+
+    def _feed_string(self, text: str, i: int) -> int:
+        if self.escape:
+            self.raw.append(text[i])
+            self.escape = False
+            return i + 1
+        match = STRING_SPECIAL.search(text, i)
+        if match is None:
+            self.raw.append(text[i:])
+            return len(text)
+        self.raw.append(text[i:match.start()])
+        if match.group() == "\\":
+            self.raw.append("\\")
+            self.escape = True
+            return match.end()
+
+        value = json.loads(f'"{"".join(self.raw)}"')
+        if self.token == "key":
+            self.stack[-1][1] = value
+        else:
+            self._put(value, final=True)
+        self.token = None
+        self.raw = []
+        return match.end()
+
+    def _decode_partial_string(self) -> Optional[str]:
+        raw = PARTIAL_ESCAPE.sub("", "".join(self.raw))
+        try:
+            return json.loads(f'"{raw}"')
+        except ValueError:
+            return None
+
+    def _finish_scalar(self):
+        if self.token != "scalar":
+            return
+        raw = "".join(self.raw)
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = raw
+        self.token = None
+        self.raw = []
+        self._put(value, final=True)
+
+    def _put(self, value: Any, final: bool):
+        container, key = self.stack[-1]
+        if isinstance(container, dict):
+            container[key] = value
+            if final:
+                self.stack[-1][1] = None
+        elif self.placed:
+            container[-1] = value
+        else:
+            container.append(value)
+        self.placed = not final
+
+    def _open(self, container: Any):
+        if self.stack:
+            self._put(container, final=True)
+        else:
+            self.root = container
+        self.stack.append([container, None])
+
+    def _close(self):
+        if not self.stack:
+            return
+        self.stack.pop()
+        if not self.stack:
+            self.done = True
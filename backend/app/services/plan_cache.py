@@ -0,0 +1,125 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional
+
+import redis
+from loguru import logger
+
+from app.core.config import cfg
+from app.models.blackboard import Blackboard
+from app.services.prefetch import normalize_request
+
+
+def get_catalog_version(agents: List[dict]) -> str:
+    """Hash the agent catalog, so plans made for other agent descriptions or tools are never reused"""
+    return hashlib.sha256(json.dumps(agents, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class PlanCache:
+    """
+    LRU cache of the validated first plans of recurring requests,
+    keyed on the normalized request and the version of the agent catalog.
+    With a Redis URL, the API and the Celery workers share the invalidation epoch and the hit and miss
+    counters, so an invalidation reaches every process; the plans stay in the memory of each process.
+    """
+    key_prefix = "plan-cache:"
+
+    def __init__(self, max_entries: int, ttl: float, redis_url: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.epoch = 0
+        self.client = redis.Redis.from_url(redis_url, decode_responses=True) if redis_url else None
+
+    def get_key(self, request: str, agents: List[dict]) -> tuple:
+        return normalize_request(request), get_catalog_version(agents)
+
+    def get_epoch(self) -> Optional[int]:
+        """Return the invalidation epoch, None if the shared one can not be read"""
+        if self.client is None:
+            return self.epoch
+        try:
+            return int(self.client.get(self.key_prefix + "epoch") or 0)
+        except redis.RedisError as e:
+            logger.warning(f"Plan cache epoch lookup failed: {e}")
+            return None
+
+    def get(self, request: str, agents: List[dict]) -> Optional[Blackboard]:
+        key = self.get_key(request, agents)
+        epoch = self.get_epoch()
+        with self.lock:
+            entry = self.entries.get(key)
+            # Plans cached before an invalidation in any process are dropped
+            if entry is not None and (time.monotonic() > entry[1] or entry[2] != epoch):
+                del self.entries[key]
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(key)
+        self._count("hits" if entry is not None else "misses")
+        if entry is None:
+            return None
+        # Every request gets its own copy of the plan
+        return entry[0].model_copy(deep=True)
+
+    def set(self, request: str, agents: List[dict], blackboard: Blackboard):
+        key = self.get_key(request, agents)
+        epoch = self.get_epoch()
+        if epoch is None:
+            return
+        with self.lock:
+            self.entries[key] = (blackboard.model_copy(deep=True), time.monotonic() + self.ttl, epoch)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self):
+        """Drop all cached plans of every process, e.g. after the agent descriptions or the planner prompt changed"""
+        with self.lock:
+            logger.info(f"Invalidating {len(self.entries)} cached plans")
+            self.entries.clear()
+            self.epoch += 1
+        if self.client is not None:
+            try:
+                self.client.incr(self.key_prefix + "epoch")
+            except redis.RedisError as e:
+                logger.warning(f"Plan cache invalidation failed: {e}")
+
+    def _count(self, counter: str):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        if self.client is not None:
+            try:
+                self.client.hincrby(self.key_prefix + "stats", counter, 1)
+            except redis.RedisError as e:
+                logger.warning(f"Plan cache stats update failed: {e}")
+
+    def get_stats(self) -> dict:
+        """Return the hit and miss counters of all processes when they are shared, and the entries of this process"""
+        with self.lock:
+            hits, misses, entries = self.hits, self.misses, len(self.entries)
+        if self.client is not None:
+            try:
+                stats = self.client.hgetall(self.key_prefix + "stats")
+                hits, misses = int(stats.get("hits", 0)), int(stats.get("misses", 0))
+            except redis.RedisError as e:
+                logger.warning(f"Plan cache stats lookup failed: {e}")
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups > 0 else 0.0,
+            "entries": entries,
+        }
+
+
+@lru_cache(maxsize=None)
+def get_plan_cache() -> PlanCache:
+    """Return the process-wide plan cache"""
+    return PlanCache(cfg.PLAN_CACHE_MAX_ENTRIES, cfg.PLAN_CACHE_TTL, cfg.PLAN_CACHE_REDIS_URL or None)
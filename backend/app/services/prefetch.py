@@ -0,0 +1,222 @@
+import asyncio
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+from langchain_core.tools import BaseTool
+from loguru import logger
+
+from app.core.config import cfg
+from app.services.tool_cache import get_tool_call_key
+
+
+# Request keywords and the read-only tools that are likely to be needed for them
+PREFETCH_KEYWORDS = {
+    "weather": ["get_current_weather"],
+    "rain": ["get_current_weather"],
+    "sunny": ["get_current_weather"],
+    "window": ["get_all_windows_status"],
+    "light": ["get_all_lights_status"],
+    "stove": ["get_all_stoves_status"],
+    "water": ["check_water_level"],
+    "temperature": ["get_room_temperatures"],
+    "hot": ["get_room_temperatures"],
+    "cold": ["get_room_temperatures"],
+    "humid": ["get_room_humidity"],
+    "news": ["get_top_headlines"],
+    "calendar": ["get_today_events"],
+    "meeting": ["get_today_events"],
+    "email": ["get_unread_emails"],
+    "mail": ["get_unread_emails"],
+    "security": ["check_occupancy"],
+    "stranger": ["check_occupancy"],
+    "leaving": ["get_all_windows_status", "get_all_lights_status", "get_all_stoves_status"],
+}
+
+MAX_LEARNED_REQUESTS = 1000
+
+_prefetch_executor = ThreadPoolExecutor(max_workers=cfg.TOOL_CALL_MAX_WORKERS, thread_name_prefix="prefetch")
+
+# Prefetch caches of the running requests, keyed by request id
+_caches: Dict[str, "PrefetchCache"] = {}
+_caches_lock = threading.Lock()
+
+
+def normalize_request(request: str) -> str:
+    """Lowercase the request and strip punctuation and repeated whitespace"""
+    return " ".join(re.sub(r"[^\w\s:]", " ", request.lower()).split())
+
+
+class PrefetchCache:
+    """
+    Short-lived, per-request cache of speculatively started tool calls.
+    """
+    def __init__(self, prefetcher: "SpeculativePrefetcher", request: str):
+        self.prefetcher = prefetcher
+        self.request = request
+        self.created_at = time.monotonic()
+        self.results: Dict[str, Future] = {}
+        self.lock = threading.Lock()
+
+    def is_expired(self) -> bool:
+        return time.monotonic() - self.created_at > cfg.PREFETCH_TTL
+
+    def start(self, tool: BaseTool):
+        key = get_tool_call_key(tool.name, {})
+        with self.lock:
+            if key not in self.results:
+                logger.info(f"Prefetching {tool.name}")
+                self.results[key] = _prefetch_executor.submit(tool.invoke, {})
+
+    def get(self, tool_name: str, args: Dict[str, Any]) -> Optional[Future]:
+        """Take the prefetched call, it answers only the first call of the tool, later ones read the tool again"""
+        with self.lock:
+            future = self.results.pop(get_tool_call_key(tool_name, args), None)
+        if future is None and not args:
+            # Remember the tools this request needed for the next time it is seen
+            self.prefetcher.learn(self.request, tool_name)
+        return future
+
+    def invalidate(self, tool_names: Iterable[str]):
+        """Drop the prefetched results of the given tools, an action made them stale"""
+        with self.lock:
+            for tool_name in tool_names:
+                self.results.pop(get_tool_call_key(tool_name, {}), None)
+
+    def cancel(self):
+        """Drop all prefetched results, calls that did not start yet are cancelled"""
+        with self.lock:
+            futures = list(self.results.values())
+            self.results.clear()
+        for future in futures:
+            future.cancel()
+
+    def wrap(self, tool: BaseTool) -> BaseTool:
+        """Return a copy of the tool that answers from the prefetched result when there is one"""
+        cache = self
+
+        def func(**kwargs):
+            future = cache.get(tool.name, kwargs)
+            if future is not None:
+                try:
+                    result = future.result(timeout=cfg.TOOL_CALL_TIMEOUT)
+                    logger.info(f"Using prefetched result of {tool.name}")
+                    return result
+                except Exception as e:
+                    logger.warning(f"Prefetched call of {tool.name} failed, calling it again: {e}")
+            return tool.func(**kwargs)
+
+        async def coroutine(**kwargs):
+            future = cache.get(tool.name, kwargs)
+            if future is not None:
+                try:
+                    result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=cfg.TOOL_CALL_TIMEOUT)
+                    logger.info(f"Using prefetched result of {tool.name}")
+                    return result
+                except Exception as e:
+                    logger.warning(f"Prefetched call of {tool.name} failed, calling it again: {e}")
+            return await tool.coroutine(**kwargs)
+
+        update = {"func": func}
+        if tool.coroutine is not None:
+            update["coroutine"] = coroutine
+        return tool.model_copy(update=update)
+
+    def wrap_action(self, tool: BaseTool, invalidates: Iterable[str]) -> BaseTool:
+        """Return a copy of the action that drops the prefetched results of the given read tools before it runs"""
+        cache = self
+        invalidates = list(invalidates)
+
+        def func(**kwargs):
+            cache.invalidate(invalidates)
+            return tool.func(**kwargs)
+
+        async def coroutine(**kwargs):
+            cache.invalidate(invalidates)
+            return await tool.coroutine(**kwargs)
+
+        update = {"func": func}
+        if tool.coroutine is not None:
+            update["coroutine"] = coroutine
+        return tool.model_copy(update=update)
+
+
+class SpeculativePrefetcher:
+    """
+    Starts likely read-only tool calls while the planner is still running.
+    Only parameterless tools that an agent declares in read_only_tools are ever speculated.
+    """
+    def __init__(self, edge_agents: Dict[str, Any]):
+        self.tools: Dict[str, BaseTool] = {}
+        for agent in edge_agents.values():
+            # Prefetched results also fill the tool result cache
+            for tool in agent.get_result_cached_tools():
+                if tool.name in agent.read_only_tools and not self._has_required_args(tool):
+                    self.tools[tool.name] = tool
+
+        self.learned: "OrderedDict[str, set]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _has_required_args(self, tool: BaseTool) -> bool:
+        args_schema = tool.args_schema
+        if isinstance(args_schema, dict):
+            return len(args_schema.get("required", [])) > 0
+        return len(tool.args) > 0
+
+    def select_tools(self, request: str) -> List[str]:
+        """Pick the tools to speculate from the request keywords and what similar requests needed before"""
+        normalized_request = normalize_request(request)
+        words = normalized_request.split()
+        tool_names = []
+        for keyword, keyword_tools in PREFETCH_KEYWORDS.items():
+            # Keywords match word prefixes, e.g. "window" matches "windows"
+            if any(word.startswith(keyword) for word in words):
+                tool_names.extend(keyword_tools)
+        with self.lock:
+            tool_names.extend(self.learned.get(normalized_request, []))
+
+        return [tool_name for tool_name in dict.fromkeys(tool_names) if tool_name in self.tools]
+
+    def learn(self, request: str, tool_name: str):
+        if tool_name not in self.tools:
+            return
+        normalized_request = normalize_request(request)
+        with self.lock:
+            self.learned.setdefault(normalized_request, set()).add(tool_name)
+            self.learned.move_to_end(normalized_request)
+            while len(self.learned) > MAX_LEARNED_REQUESTS:
+                self.learned.popitem(last=False)
+
+    def start(self, request_id: str, request: str) -> PrefetchCache:
+        """Start the speculative tool calls of a request without waiting for them"""
+        cache = PrefetchCache(self, request)
+        for tool_name in self.select_tools(request):
+            cache.start(self.tools[tool_name])
+
+        with _caches_lock:
+            # Drop the caches of requests that were not released
+            for expired_request_id in [key for key, value in _caches.items() if value.is_expired()]:
+                del _caches[expired_request_id]
+            _caches[request_id] = cache
+
+        return cache
+
+
+def get_prefetch_cache(request_id: str) -> Optional[PrefetchCache]:
+    """Return the prefetch cache of a running request, if prefetching was started for it"""
+    with _caches_lock:
+        cache = _caches.get(request_id)
+    if cache is None or cache.is_expired():
+        return None
+    return cache
+
+
+def release_prefetch_cache(request_id: str):
+    """Drop the prefetch cache of a finished request"""
+    with _caches_lock:
+        cache = _caches.pop(request_id, None)
+    if cache is not None:
+        cache.cancel()
@@ -0,0 +1,149 @@
+import json
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis
+from loguru import logger
+
+from app.core.config import cfg
+
+# Task id, message, and the blackboard snapshot to store with it
+QueuedMessage = Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]
+
+
+def get_task_channel(task_id: str) -> str:
+    return f"task:{task_id}"
+
+
+def get_task_snapshot_key(task_id: str) -> str:
+    return f"task-snapshot:{task_id}"
+
+
+def get_blackboard_delta(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Return the changed fields of each changed blackboard section. A changed step list is sent as its changed
+    steps by index and its new length, the steps of a task are only ever updated or appended.
+    """
+    delta = {}
+    for section, value in current.items():
+        old_value = previous.get(section)
+        if value == old_value:
+            continue
+        if not isinstance(value, dict) or not isinstance(old_value, dict):
+            delta[section] = value
+            continue
+        changes = {}
+        for field, field_value in value.items():
+            old_field_value = old_value.get(field)
+            if field_value == old_field_value:
+                continue
+            if isinstance(field_value, list) and isinstance(old_field_value, list):
+                changes[field] = {
+                    "changed": {
+                        str(i): item for i, item in enumerate(field_value)
+                        if i >= len(old_field_value) or item != old_field_value[i]
+                    },
+                    "length": len(field_value),
+                }
+            else:
+                changes[field] = field_value
+        delta[section] = changes
+    return delta
+
+
+class ProgressPublisher:
+    """
+    Publishes task progress to the Redis channels of the WebSocket clients. Callers only queue the message,
+    a background thread sends everything queued in one pipeline. A single queue and sender keep the
+    messages of every task in order.
+
+    Blackboard updates are sequence-numbered deltas against the previous update of the task, the full
+    snapshot is stored next to the channel for clients that connect late or miss an update.
+    """
+    def __init__(self, url: str, max_batch: int):
+        self.client = redis.Redis.from_url(url)
+        self.max_batch = max_batch
+        self.queue: deque = deque()
+        self.sending = False
+        self.condition = threading.Condition()
+        self.thread = None
+        # Sequence number and blackboard of the last update of each running task
+        self.blackboards: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+
+    def publish(self, task_id: str, message: Dict[str, Any]):
+        """Queue a progress message of the task without waiting for Redis"""
+        with self.condition:
+            self._enqueue(task_id, message)
+
+    def publish_blackboard(self, task_id: str, message: Dict[str, Any], blackboard: Dict[str, Any]):
+        """Queue a blackboard update of the task, as a delta against its previous one"""
+        with self.condition:
+            seq, previous = self.blackboards.get(task_id, (0, None))
+            seq += 1
+            self.blackboards[task_id] = (seq, blackboard)
+            snapshot = {**message, "type": "snapshot", "seq": seq, "blackboard": blackboard}
+            if previous is None:
+                self._enqueue(task_id, snapshot, snapshot)
+            else:
+                delta = {**message, "type": "delta", "seq": seq, "delta": get_blackboard_delta(previous, blackboard)}
+                self._enqueue(task_id, delta, snapshot)
+
+    def end_task(self, task_id: str):
+        """Forget the last blackboard of a finished task, its stored snapshot expires on its own"""
+        with self.condition:
+            self.blackboards.pop(task_id, None)
+
+    def _enqueue(self, task_id: str, message: Dict[str, Any], snapshot: Optional[Dict[str, Any]] = None):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="progress-publisher", daemon=True)
+            self.thread.start()
+        self.queue.append((task_id, message, snapshot))
+        self.condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued message is sent, return False on timeout"""
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.queue and not self.sending, timeout)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.queue)
+                batch = [self.queue.popleft() for _ in range(min(len(self.queue), self.max_batch))]
+                self.sending = True
+            try:
+                self._send(self._coalesce(batch))
+            finally:
+                with self.condition:
+                    self.sending = False
+                    self.condition.notify_all()
+
+    def _coalesce(self, batch: List[QueuedMessage]) -> List[QueuedMessage]:
+        """Drop streamed summaries superseded by a later one of the same task, each carries the whole summary so far"""
+        last_streaming = {task_id: i for i, (task_id, message, _) in enumerate(batch) if message.get("status") == "streaming"}
+        return [
+            (task_id, message, snapshot) for i, (task_id, message, snapshot) in enumerate(batch)
+            if message.get("status") != "streaming" or last_streaming[task_id] == i
+        ]
+
+    def _send(self, batch: List[QueuedMessage]):
+        # Only the last snapshot of a task in the batch is stored, the earlier ones are superseded
+        last_snapshot = {task_id: i for i, (task_id, _, snapshot) in enumerate(batch) if snapshot is not None}
+        try:
+            pipeline = self.client.pipeline(transaction=False)
+            for i, (task_id, message, snapshot) in enumerate(batch):
+                # Stored before the delta is published, a client resyncing on it finds the snapshot it needs
+                if snapshot is not None and last_snapshot[task_id] == i:
+                    pipeline.set(get_task_snapshot_key(task_id), json.dumps(snapshot, default=str), ex=cfg.PROGRESS_SNAPSHOT_TTL)
+                pipeline.publish(get_task_channel(task_id), json.dumps(message, default=str))
+            pipeline.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Publishing {len(batch)} progress messages failed: {e}")
+
+
+@lru_cache(maxsize=None)
+def get_progress_publisher() -> ProgressPublisher:
+    """Return the process-wide progress publisher"""
+    return ProgressPublisher(cfg.PROGRESS_REDIS_URL, cfg.PROGRESS_MAX_BATCH)
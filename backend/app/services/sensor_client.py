@@ -0,0 +1,152 @@
+import asyncio
+import random
+import statistics
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, Dict
+
+import httpx
+from loguru import logger
+
+from app.core.config import cfg
+
+# Latency samples kept per endpoint for the percentiles
+LATENCY_SAMPLES = 256
+
+
+class EndpointStats:
+    """Latency and failures of the requests to one sensor endpoint"""
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def to_dict(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "errors": self.errors,
+            "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+            "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+            "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0,
+            "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        }
+
+
+class SensorClient:
+    """
+    Keep-alive pooled HTTP client for the sensor gateway. Every request is bounded by the connect and read
+    timeouts of its endpoint, and connection errors, timeouts and 5xx responses are retried with jittered
+    exponential backoff.
+    """
+    def __init__(self, base_url: str, timeout: httpx.Timeout, endpoint_timeouts: Dict[str, httpx.Timeout],
+                 max_retries: int, retry_backoff: float, limits: httpx.Limits):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.endpoint_timeouts = endpoint_timeouts
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.limits = limits
+        self.client = httpx.Client(limits=limits)
+        # Pooled connections belong to the event loop that opened them
+        self._async_clients = weakref.WeakKeyDictionary()
+        self.stats: Dict[str, EndpointStats] = {}
+        self.lock = threading.Lock()
+
+    def get_async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            if loop not in self._async_clients:
+                self._async_clients[loop] = httpx.AsyncClient(limits=self.limits)
+            return self._async_clients[loop]
+
+    def get_url(self, endpoint: str) -> str:
+        return f"{self.base_url}/{endpoint}"
+
+    def get_timeout(self, endpoint: str) -> httpx.Timeout:
+        return self.endpoint_timeouts.get(endpoint, self.timeout)
+
+    def get_retry_delay(self, attempt: int) -> float:
+        # Full jitter, so clients retrying a flapping gateway do not hit it in lockstep
+        return random.uniform(0, self.retry_backoff * 2 ** attempt)
+
+    def get(self, endpoint: str) -> Any:
+        """Return the JSON response of the endpoint"""
+        for attempt in range(self.max_retries + 1):
+            started_at = time.monotonic()
+            try:
+                response = self.client.get(self.get_url(endpoint), timeout=self.get_timeout(endpoint))
+                if not self._should_retry(endpoint, response, started_at, attempt):
+                    response.raise_for_status()
+                    return response.json()
+            except httpx.TransportError as e:
+                if not self._should_retry(endpoint, e, started_at, attempt):
+                    raise
+            time.sleep(self.get_retry_delay(attempt))
+
+    async def aget(self, endpoint: str) -> Any:
+        """Return the JSON response of the endpoint asynchronously"""
+        client = self.get_async_client()
+        for attempt in range(self.max_retries + 1):
+            started_at = time.monotonic()
+            try:
+                response = await client.get(self.get_url(endpoint), timeout=self.get_timeout(endpoint))
+                if not self._should_retry(endpoint, response, started_at, attempt):
+                    response.raise_for_status()
+                    return response.json()
+            except httpx.TransportError as e:
+                if not self._should_retry(endpoint, e, started_at, attempt):
+                    raise
+            await asyncio.sleep(self.get_retry_delay(attempt))
+
+    def _should_retry(self, endpoint: str, outcome: Any, started_at: float, attempt: int) -> bool:
+        """Record the outcome of an attempt and return whether the request should be sent again"""
+        failed = isinstance(outcome, Exception) or outcome.status_code >= 500
+        retry = failed and attempt < self.max_retries
+        with self.lock:
+            stats = self.stats.setdefault(endpoint, EndpointStats())
+            stats.requests += 1
+            stats.latencies.append(time.monotonic() - started_at)
+            if failed:
+                stats.errors += 1
+            if retry:
+                stats.retries += 1
+        if failed:
+            reason = outcome if isinstance(outcome, Exception) else f"status {outcome.status_code}"
+            logger.warning(f"Sensor request to {endpoint} failed ({reason}), attempt {attempt + 1} of {self.max_retries + 1}")
+        return retry
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            return {endpoint: stats.to_dict() for endpoint, stats in self.stats.items()}
+
+
+_sensor_client = None
+_sensor_client_lock = threading.Lock()
+
+
+def get_sensor_client() -> SensorClient:
+    """Return the process-wide sensor gateway client"""
+    global _sensor_client
+    with _sensor_client_lock:
+        if _sensor_client is None:
+            _sensor_client = SensorClient(
+                cfg.SENSOR_GATEWAY_URL,
+                httpx.Timeout(cfg.SENSOR_READ_TIMEOUT, connect=cfg.SENSOR_CONNECT_TIMEOUT),
+                {
+                    endpoint: httpx.Timeout(read, connect=connect)
+                    for endpoint, (connect, read) in cfg.SENSOR_ENDPOINT_TIMEOUTS.items()
+                },
+                cfg.SENSOR_MAX_RETRIES,
+                cfg.SENSOR_RETRY_BACKOFF,
+                httpx.Limits(
+                    max_connections=cfg.SENSOR_MAX_CONNECTIONS,
+                    max_keepalive_connections=cfg.SENSOR_MAX_CONNECTIONS,
+                    keepalive_expiry=cfg.SENSOR_KEEPALIVE_EXPIRY,
+                ),
+            )
+        return _sensor_client
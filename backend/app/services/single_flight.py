@@ -0,0 +1,233 @@
+import asyncio
+import copy
+import hashlib
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import redis
+from langchain_core.tools import BaseTool
+from loguru import logger
+
+from app.core.config import cfg
+from app.services.tool_cache import get_tool_call_key
+
+# Compare-and-delete, a worker only releases the lock it holds
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class AbandonedCall(Exception):
+    """The leading caller was cancelled before the call returned"""
+
+
+class SingleFlight:
+    """
+    Coalesces identical calls that are in flight at the same time: the first caller runs the call and the
+    others wait for its result. Threads and event loops of the process share one call; with a Redis URL,
+    the workers share it too, one worker leads and the others wait for the result it publishes.
+    """
+    key_prefix = "single-flight:"
+
+    def __init__(self, timeout: float, redis_url: Optional[str] = None, poll_interval: float = 0.05):
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.calls: Dict[str, Future] = {}
+        self.lock = threading.Lock()
+        self.client = redis.Redis.from_url(redis_url, decode_responses=True) if redis_url else None
+        self.release_lock = self.client.register_script(RELEASE_LOCK_SCRIPT) if self.client else None
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        """Return the future of the call and whether this caller leads it"""
+        with self.lock:
+            future = self.calls.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self.calls[key] = future
+            return future, True
+
+    def _finish(self, key: str, future: Future, result: Any = None, error: BaseException = None):
+        with self.lock:
+            del self.calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            # The leader's caller may change its result while the followers copy it
+            future.set_result(copy.deepcopy(result))
+
+    def do(self, key: str, func: Callable[[], Any]) -> Any:
+        future, leader = self._join(key)
+        if not leader:
+            try:
+                return copy.deepcopy(future.result(timeout=self.timeout))
+            except (FutureTimeoutError, AbandonedCall):
+                logger.warning(f"Shared call {key} did not return, calling it again")
+                return func()
+
+        try:
+            result = self._call_across_workers(key, func) if self.client else func()
+        except Exception as e:
+            self._finish(key, future, error=e)
+            raise
+        except BaseException:
+            self._finish(key, future, error=AbandonedCall())
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    async def ado(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        future, leader = self._join(key)
+        if not leader:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.timeout)
+                return copy.deepcopy(result)
+            except (asyncio.TimeoutError, AbandonedCall):
+                logger.warning(f"Shared call {key} did not return, calling it again")
+                return await func()
+
+        try:
+            result = await (self._acall_across_workers(key, func) if self.client else func())
+        except Exception as e:
+            self._finish(key, future, error=e)
+            raise
+        except BaseException:
+            self._finish(key, future, error=AbandonedCall())
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    def _get_redis_keys(self, key: str) -> Tuple[str, str]:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return f"{self.key_prefix}lock:{digest}", f"{self.key_prefix}result:{digest}:"
+
+    def _acquire(self, key: str, token: str) -> Optional[str]:
+        """Return None if this worker leads the call, the token of the leading worker otherwise"""
+        lock_key, _ = self._get_redis_keys(key)
+        for _ in range(2):
+            if self.client.set(lock_key, token, nx=True, px=int(self.timeout * 1000)):
+                return None
+            leader = self.client.get(lock_key)
+            if leader is not None:
+                return leader
+        return ""
+
+    def _get_shared_result(self, key: str, leader: str) -> Tuple[str, Any]:
+        """Return done and the result, running, or failed if the leader released the lock without a result"""
+        lock_key, result_key = self._get_redis_keys(key)
+        for check_lock in (True, False):
+            value = self.client.get(result_key + leader)
+            if value is not None:
+                return "done", json.loads(value)
+            # The leader may publish its result between the two reads
+            if check_lock and self.client.get(lock_key) == leader:
+                return "running", None
+        return "failed", None
+
+    def _share(self, key: str, token: str, result: Any = None, failed: bool = False):
+        lock_key, result_key = self._get_redis_keys(key)
+        try:
+            if not failed:
+                try:
+                    value = json.dumps(result)
+                except (TypeError, ValueError):
+                    value = None
+                if value is not None:
+                    self.client.set(result_key + token, value, px=int(self.timeout * 1000))
+            self.release_lock(keys=[lock_key], args=[token])
+        except redis.RedisError as e:
+            logger.warning(f"Sharing call {key} failed: {e}")
+
+    def _call_across_workers(self, key: str, func: Callable[[], Any]) -> Any:
+        token = uuid.uuid4().hex
+        try:
+            leader = self._acquire(key, token)
+            if leader is not None:
+                deadline = time.monotonic() + self.timeout
+                while time.monotonic() < deadline:
+                    state, result = self._get_shared_result(key, leader)
+                    if state == "done":
+                        return result
+                    if state == "failed":
+                        break
+                    time.sleep(self.poll_interval)
+                return func()
+        except redis.RedisError as e:
+            logger.warning(f"Coalescing call {key} across workers failed: {e}")
+            return func()
+
+        try:
+            result = func()
+        except BaseException:
+            self._share(key, token, failed=True)
+            raise
+        self._share(key, token, result)
+        return result
+
+    async def _acall_across_workers(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        token = uuid.uuid4().hex
+        try:
+            leader = await asyncio.to_thread(self._acquire, key, token)
+            if leader is not None:
+                deadline = time.monotonic() + self.timeout
+                while time.monotonic() < deadline:
+                    state, result = await asyncio.to_thread(self._get_shared_result, key, leader)
+                    if state == "done":
+                        return result
+                    if state == "failed":
+                        break
+                    await asyncio.sleep(self.poll_interval)
+                return await func()
+        except redis.RedisError as e:
+            logger.warning(f"Coalescing call {key} across workers failed: {e}")
+            return await func()
+
+        try:
+            result = await func()
+        except BaseException:
+            await asyncio.to_thread(self._share, key, token, failed=True)
+            raise
+        await asyncio.to_thread(self._share, key, token, result)
+        return result
+
+    def wrap(self, tool: BaseTool) -> BaseTool:
+        """Return a copy of the tool whose identical concurrent calls share one upstream call"""
+        single_flight = self
+
+        def func(**kwargs):
+            return single_flight.do(get_tool_call_key(tool.name, kwargs), lambda: tool.func(**kwargs))
+
+        async def coroutine(**kwargs):
+            return await single_flight.ado(get_tool_call_key(tool.name, kwargs), lambda: tool.coroutine(**kwargs))
+
+        update = {"func": func}
+        if tool.coroutine is not None:
+            update["coroutine"] = coroutine
+        return tool.model_copy(update=update)
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> Optional[SingleFlight]:
+    """Return the process-wide single-flight group configured by SINGLE_FLIGHT, None if coalescing is off"""
+    global _single_flight
+    if cfg.SINGLE_FLIGHT == "off":
+        return None
+    with _single_flight_lock:
+        if _single_flight is None:
+            if cfg.SINGLE_FLIGHT == "memory":
+                _single_flight = SingleFlight(cfg.SINGLE_FLIGHT_TIMEOUT)
+            elif cfg.SINGLE_FLIGHT == "redis":
+                _single_flight = SingleFlight(cfg.SINGLE_FLIGHT_TIMEOUT, cfg.SINGLE_FLIGHT_REDIS_URL)
+            else:
+                raise ValueError(f"Unknown SINGLE_FLIGHT: {cfg.SINGLE_FLIGHT}")
+        return _single_flight
@@ -0,0 +1,121 @@
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from langchain_core.tools import BaseTool
+from loguru import logger
+
+from app.core.config import cfg
+
+
+def get_tool_call_key(tool_name: str, args: Dict[str, Any]) -> str:
+    return f"{tool_name}:{json.dumps(args or {}, sort_keys=True, default=str)}"
+
+
+class ToolResultCache:
+    """
+    Process-wide LRU cache of tool results. Every read tool has its own TTL,
+    and actions drop the cached results of the read tools they make stale.
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[str, Any, float]]" = OrderedDict()
+        # Invalidations of every tool so far, a read that overlapped one does not store its result
+        self.generations: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def get(self, tool_name: str, args: Dict[str, Any]) -> Tuple[bool, Any]:
+        """Return whether a fresh result is cached and the result"""
+        key = get_tool_call_key(tool_name, args)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False, None
+            _, result, expires_at = entry
+            if time.monotonic() > expires_at:
+                del self.entries[key]
+                return False, None
+            self.entries.move_to_end(key)
+        # Callers get their own copy, results are often dicts
+        return True, copy.deepcopy(result)
+
+    def get_generation(self, tool_name: str) -> int:
+        with self.lock:
+            return self.generations.get(tool_name, 0)
+
+    def set(self, tool_name: str, args: Dict[str, Any], result: Any, ttl: float, generation: Optional[int] = None):
+        """Cache the result, unless the tool was invalidated since the given generation was read"""
+        key = get_tool_call_key(tool_name, args)
+        with self.lock:
+            if generation is not None and self.generations.get(tool_name, 0) != generation:
+                return
+            self.entries[key] = (tool_name, copy.deepcopy(result), time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, tool_names: Iterable[str]):
+        """Drop the cached results of the given tools for all arguments"""
+        tool_names = set(tool_names)
+        with self.lock:
+            for tool_name in tool_names:
+                self.generations[tool_name] = self.generations.get(tool_name, 0) + 1
+            for key in [key for key, (tool_name, _, _) in self.entries.items() if tool_name in tool_names]:
+                del self.entries[key]
+
+    def wrap(self, tool: BaseTool, ttl: Optional[float] = None, invalidates: Iterable[str] = ()) -> BaseTool:
+        """
+        Return a copy of the tool that answers from the cache for ttl seconds, and that invalidates
+        the results of the given read tools after every call.
+        """
+        invalidates = list(invalidates)
+        if ttl is None and not invalidates:
+            return tool
+        cache = self
+
+        def func(**kwargs):
+            if ttl is not None:
+                found, result = cache.get(tool.name, kwargs)
+                if found:
+                    logger.info(f"Using cached result of {tool.name}")
+                    return result
+            # Read before the call, an action running meanwhile makes its result stale
+            generation = cache.get_generation(tool.name)
+            result = tool.func(**kwargs)
+            cache._store(tool, kwargs, result, ttl, invalidates, generation)
+            return result
+
+        async def coroutine(**kwargs):
+            if ttl is not None:
+                found, result = cache.get(tool.name, kwargs)
+                if found:
+                    logger.info(f"Using cached result of {tool.name}")
+                    return result
+            # Read before the call, an action running meanwhile makes its result stale
+            generation = cache.get_generation(tool.name)
+            result = await tool.coroutine(**kwargs)
+            cache._store(tool, kwargs, result, ttl, invalidates, generation)
+            return result
+
+        update = {"func": func}
+        if tool.coroutine is not None:
+            update["coroutine"] = coroutine
+        return tool.model_copy(update=update)
+
+    def _store(self, tool: BaseTool, args: Dict[str, Any], result: Any, ttl: Optional[float], invalidates: list,
+               generation: int):
+        if ttl is not None:
+            self.set(tool.name, args, result, ttl, generation)
+        if invalidates:
+            logger.info(f"{tool.name} invalidated the cached results of {invalidates}")
+            self.invalidate(invalidates)
+
+
+@lru_cache(maxsize=None)
+def get_tool_result_cache() -> ToolResultCache:
+    """Return the process-wide tool result cache"""
+    return ToolResultCache(cfg.TOOL_RESULT_CACHE_MAX_ENTRIES)
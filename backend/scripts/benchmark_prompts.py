@@ -0,0 +1,67 @@
+"""
+Measure the CPU cost of building the prompt messages of every agent per call, with a template built
+per call as before and with the precompiled template of the agent.
+
+Run from the backend directory: python -m scripts.benchmark_prompts [calls]
+"""
+import os
+import sys
+import time
+
+# Agents create their chat model on construction, no request is sent
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from app.models.blackboard import Blackboard
+from app.models.state import State
+from app.services.orchestration import OrchestrationService
+
+
+def build_per_call(agent, input):
+    prompt = ChatPromptTemplate([("system", agent.get_prompt()), ("user", agent.user_prompt)])
+    return prompt.invoke(input).to_messages()
+
+
+def build_precompiled(agent, input):
+    return agent.get_prompt_template().invoke(input).to_messages()
+
+
+def measure(build, agent, input, calls: int) -> float:
+    """Return the CPU microseconds per call"""
+    build(agent, input)
+    started_at = time.process_time()
+    for _ in range(calls):
+        build(agent, input)
+    return (time.process_time() - started_at) / calls * 1e6
+
+
+def main(calls: int):
+    service = OrchestrationService()
+    blackboard = Blackboard(**{
+        "plan": {"steps": [
+            {"id": "weather", "agent": "weather", "description": "Check the weather", "status": "completed"},
+            {"id": "windows", "agent": "window", "description": "Close the windows if it rains", "depends_on": ["weather"]},
+        ]},
+        "history": {"steps": [
+            {"agent": "weather", "description": "get_current_weather(): {'condition': 'rainy'}", "status": "completed"},
+        ]},
+    })
+    state = State(request="user: Close the windows if it rains", blackboard=blackboard)
+    input = {
+        "agents": state.agents,
+        "request": state.request,
+        "blackboard": str(state.blackboard),
+        "pending_actions": blackboard.plan.steps[1:],
+    }
+
+    agents = [service.planner_agent, service.orchestration_agent, service.edge_agents["window"]]
+    print(f"{'agent':<24}{'per call (us)':>16}{'precompiled (us)':>20}{'speedup':>10}")
+    for agent in agents:
+        per_call = measure(build_per_call, agent, input, calls)
+        precompiled = measure(build_precompiled, agent, input, calls)
+        print(f"{agent.name:<24}{per_call:>16.1f}{precompiled:>20.1f}{per_call / precompiled:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
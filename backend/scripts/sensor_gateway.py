@@ -0,0 +1,64 @@
+"""
+Local stand-in for the sensor gateway, so the sensor tools and the device twins can be run offline.
+Serves simulated readings under the gateway paths and can push them to the device twin endpoint.
+
+Run from the backend directory: python -m scripts.sensor_gateway [--port 8081] [--push-url URL] [--push-interval 5]
+and point the backend at it with SENSOR_GATEWAY_URL=http://localhost:8081/api/v1
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, HTTPException
+
+from app.services.device_twin import TEMPERATURE_DEVICE, HUMIDITY_DEVICE, OCCUPANCY_DEVICE, HEADING_DEVICE
+
+READERS = {
+    TEMPERATURE_DEVICE: lambda: round(random.uniform(19.0, 25.0), 1),
+    HUMIDITY_DEVICE: lambda: random.randint(35, 60),
+    OCCUPANCY_DEVICE: lambda: random.choice([0, 1]),
+    HEADING_DEVICE: lambda: random.randint(0, 359),
+}
+
+
+def read(device: str) -> dict:
+    return {"status": "success", "message": READERS[device]()}
+
+
+def create_app(push_url: str = None, push_interval: float = 5.0) -> FastAPI:
+    app = FastAPI(title="Sensor Gateway Stand-in")
+
+    @app.get("/api/v1/{device:path}")
+    def get_device_state(device: str):
+        if device not in READERS:
+            raise HTTPException(status_code=404, detail=f"Unknown device {device}")
+        return read(device)
+
+    async def push_states():
+        async with httpx.AsyncClient() as client:
+            while True:
+                pushes = [{"device": device, "value": read(device), "timestamp": time.time()} for device in READERS]
+                try:
+                    await client.post(push_url, json=pushes)
+                except httpx.HTTPError as e:
+                    print(f"Pushing device states failed: {e}")
+                await asyncio.sleep(push_interval)
+
+    if push_url:
+        @app.on_event("startup")
+        async def start_pushing():
+            asyncio.create_task(push_states())
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--push-url", help="Device twin push endpoint, e.g. http://localhost:5172/api/v1/device/push")
+    parser.add_argument("--push-interval", type=float, default=5.0)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.push_url, args.push_interval), host="0.0.0.0", port=args.port)
@@ -0,0 +1,107 @@
+from app.models.blackboard import Blackboard, History, Plan, Status, Step
+
+
+def make_blackboard() -> Blackboard:
+    return Blackboard(
+        plan=Plan(steps=[
+            Step(id="close_windows", agent="Window Agent", description="Close all windows"),
+            Step(id="check_weather", agent="Weather Agent", description="Check the weather", condition="if leaving"),
+        ]),
+        history=History(steps=[]),
+    )
+
+
+def get_step(blackboard: Blackboard, step_id: str) -> Step:
+    return next(step for step in blackboard.plan.steps if step.id == step_id)
+
+
+def test_apply_patch_updates_steps_and_adds_history():
+    blackboard = make_blackboard()
+    patch = blackboard.parse_patch({
+        "plan_status": "in_progress",
+        "update_steps": [{"id": "close_windows", "status": "completed", "description": "Closed 3 windows"}],
+        "add_steps": [{"agent": "Light Agent", "description": "Turn off the lights"}],
+        "add_history": [{"agent": "Window Agent", "description": "Closed 3 windows", "status": "completed"}],
+    })
+
+    patched = blackboard.apply_patch(patch)
+
+    assert get_step(patched, "close_windows").status == Status.COMPLETED
+    assert get_step(patched, "close_windows").description == "Closed 3 windows"
+    assert patched.plan.status == Status.IN_PROGRESS
+    assert patched.plan.steps[2].id == "step-1"
+    assert [step.description for step in patched.history.steps] == ["Closed 3 windows"]
+    # The patch is applied to a copy
+    assert get_step(blackboard, "close_windows").status == Status.PENDING
+
+
+def test_apply_patch_keeps_status_and_description_on_null():
+    blackboard = make_blackboard()
+    patch = blackboard.parse_patch({"update_steps": [{"id": "close_windows", "status": None, "description": None}]})
+
+    patched = blackboard.apply_patch(patch)
+
+    step = get_step(patched, "close_windows")
+    assert step.status == Status.PENDING
+    assert step.description == "Close all windows"
+    assert step in patched.get_ready_steps()
+
+
+def test_apply_patch_clears_condition_on_null():
+    blackboard = make_blackboard()
+    patch = blackboard.parse_patch({"update_steps": [{"id": "check_weather", "condition": None}]})
+
+    assert get_step(blackboard.apply_patch(patch), "check_weather").condition is None
+
+
+def test_apply_patch_only_changes_the_steps_of_its_owners():
+    blackboard = make_blackboard()
+    patch = blackboard.parse_patch({"update_steps": [
+        {"id": "close_windows", "status": "completed"},
+        {"id": "check_weather", "status": "completed"},
+    ]})
+
+    patched = blackboard.apply_patch(patch, owners="Window Agent")
+
+    assert get_step(patched, "close_windows").status == Status.COMPLETED
+    assert get_step(patched, "check_weather").status == Status.PENDING
+
+
+def test_apply_patch_ignores_unknown_and_duplicate_steps():
+    blackboard = make_blackboard()
+    patch = blackboard.parse_patch({
+        "update_steps": [{"id": "unknown", "status": "completed"}],
+        "add_steps": [{"id": "close_windows", "agent": "Window Agent", "description": "Close them again"}],
+    })
+
+    patched = blackboard.apply_patch(patch)
+
+    assert patched.plan.steps == blackboard.plan.steps
+
+
+def test_parse_patch_diffs_a_full_blackboard():
+    blackboard = make_blackboard()
+    update = blackboard.model_copy(deep=True)
+    get_step(update, "close_windows").status = Status.COMPLETED
+    update.history.steps.append(Step(agent="Window Agent", description="Closed 3 windows", status=Status.COMPLETED))
+
+    patch = blackboard.parse_patch(update.model_dump())
+
+    assert [(step_update.id, step_update.status) for step_update in patch.update_steps] == [("close_windows", "completed")]
+    assert blackboard.apply_patch(patch) == update
+
+
+def test_apply_patch_with_owners_does_not_add_steps():
+    blackboard = make_blackboard()
+    patch = blackboard.parse_patch({
+        "update_steps": [{"id": "close_windows", "status": "completed"}],
+        "add_steps": [
+            {"agent": "Window Agent", "description": "Close all windows again"},
+            {"agent": "Light Agent", "description": "Turn off the lights"},
+        ],
+    })
+
+    patched = blackboard.apply_patch(patch, owners=["Window Agent"])
+
+    assert [step.id for step in patched.plan.steps] == ["close_windows", "check_weather"]
+    assert get_step(patched, "close_windows").status == Status.COMPLETED
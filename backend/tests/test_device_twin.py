@@ -0,0 +1,32 @@
+import time
+
+import pytest
+
+from app.services.device_twin import DeviceTwin, DeviceTwinStore, MemoryDeviceTwinStore
+
+DEVICE = "iot-1/temperature"
+
+
+def test_older_state_never_replaces_a_newer_one():
+    store = MemoryDeviceTwinStore()
+    store.set(DEVICE, {"message": 21.0}, 200.0)
+    store.set(DEVICE, {"message": 19.0}, 100.0)
+
+    assert store.get(DEVICE) == ({"message": 21.0}, 200.0)
+
+
+def test_state_from_the_future_is_stored_as_now():
+    store = MemoryDeviceTwinStore()
+    device_twin = DeviceTwin(store, max_age=10)
+
+    device_twin.update(DEVICE, {"message": 21.0}, time.time() + 3600)
+
+    _, updated_at = store.get(DEVICE)
+    assert updated_at <= time.time()
+    # The state goes stale like any other once max_age has passed
+    assert device_twin._get_fresh(store.get(DEVICE), max_age=-1)[0] is False
+
+
+def test_store_must_implement_get_set_and_get_all():
+    with pytest.raises(TypeError):
+        DeviceTwinStore()
@@ -0,0 +1,43 @@
+import json
+
+from app.services.partial_json import PartialJsonParser
+
+PATCH = {
+    "plan_status": "completed",
+    "update_steps": [{"id": "check_weather", "status": "completed", "condition": None}],
+    "add_steps": [],
+    "add_history": [
+        {"agent": "orchestration", "status": "completed", "description": "It is \"rainy\" today,\ntake an umbrella ☔"},
+    ],
+}
+
+
+def feed(text: str, size: int) -> list:
+    parser = PartialJsonParser()
+    return [parser.feed(text[i:i + size]) for i in range(0, len(text), size)]
+
+
+def test_chunked_response_parses_to_the_whole_value():
+    for text in (json.dumps(PATCH), "```json\n" + json.dumps(PATCH, indent=2) + "\n```"):
+        for size in (1, 3, 7, 64):
+            assert feed(text, size)[-1] == PATCH
+
+
+def test_partial_value_includes_the_string_being_streamed():
+    parser = PartialJsonParser()
+    descriptions = []
+    for char in json.dumps(PATCH):
+        # The partial value is updated in place, read it while it streams
+        partial = parser.feed(char)
+        if partial and partial.get("add_history") and partial["add_history"][0].get("description"):
+            descriptions.append(partial["add_history"][0]["description"])
+    assert descriptions[0] == "I"
+    assert all(later.startswith(earlier) for earlier, later in zip(descriptions, descriptions[1:]))
+    assert descriptions[-1] == PATCH["add_history"][0]["description"]
+
+
+def test_text_before_the_value_is_ignored():
+    parser = PartialJsonParser()
+    assert parser.feed("```json\n") is None
+    assert parser.feed('{"a": [1, tr') == {"a": [1]}
+    assert parser.feed('ue]}\n```') == {"a": [1, True]}
@@ -0,0 +1,48 @@
+from app.models.blackboard import Blackboard, Plan, Step
+from app.services.plan_cache import PlanCache
+
+AGENTS = [{"name": "Window Agent", "description": "Opens and closes the windows"}]
+BLACKBOARD = Blackboard(plan=Plan(steps=[Step(agent="Window Agent", description="Close all windows")]))
+
+
+class SharedRedis:
+    """The keys the plan caches of the API and the workers share"""
+    def __init__(self):
+        self.values = {}
+        self.hashes = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def incr(self, key):
+        self.values[key] = str(int(self.values.get(key, 0)) + 1)
+
+    def hincrby(self, key, field, amount):
+        fields = self.hashes.setdefault(key, {})
+        fields[field] = str(int(fields.get(field, 0)) + amount)
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+
+def test_cached_plan_is_a_copy():
+    plan_cache = PlanCache(max_entries=8, ttl=60)
+    plan_cache.set("close the windows", AGENTS, BLACKBOARD)
+
+    plan = plan_cache.get("Close the windows!", AGENTS)
+
+    assert plan == BLACKBOARD and plan is not BLACKBOARD
+    assert plan_cache.get("close the windows", [{**AGENTS[0], "description": "changed"}]) is None
+
+
+def test_invalidation_reaches_every_process():
+    shared = SharedRedis()
+    api, worker = PlanCache(max_entries=8, ttl=60), PlanCache(max_entries=8, ttl=60)
+    api.client = worker.client = shared
+    worker.set("close the windows", AGENTS, BLACKBOARD)
+    assert worker.get("close the windows", AGENTS) is not None
+
+    api.invalidate()
+
+    assert worker.get("close the windows", AGENTS) is None
+    assert api.get_stats()["hits"] == 1 and api.get_stats()["misses"] == 1
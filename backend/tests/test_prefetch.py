@@ -0,0 +1,53 @@
+from langchain_core.tools import StructuredTool
+
+from app.services.prefetch import PrefetchCache, SpeculativePrefetcher, get_prefetch_cache, release_prefetch_cache
+
+WINDOWS = {"open": True}
+
+
+def get_all_windows_status() -> dict:
+    """Return the status of all windows"""
+    return dict(WINDOWS)
+
+
+def close_window() -> str:
+    """Close all windows"""
+    WINDOWS["open"] = False
+    return "closed"
+
+
+def make_cache() -> PrefetchCache:
+    WINDOWS["open"] = True
+    return PrefetchCache(SpeculativePrefetcher({}), "close the windows")
+
+
+def test_prefetched_result_answers_only_the_first_call():
+    cache = make_cache()
+    read = StructuredTool.from_function(get_all_windows_status)
+    cache.start(read)
+    cache.results[next(iter(cache.results))].result(timeout=5)
+
+    wrapped = cache.wrap(read)
+    WINDOWS["open"] = False
+    assert wrapped.invoke({}) == {"open": True}
+    assert wrapped.invoke({}) == {"open": False}
+
+
+def test_action_drops_the_prefetched_results_it_makes_stale():
+    cache = make_cache()
+    read = StructuredTool.from_function(get_all_windows_status)
+    action = StructuredTool.from_function(close_window)
+    cache.start(read)
+    cache.results[next(iter(cache.results))].result(timeout=5)
+
+    assert cache.wrap_action(action, ["get_all_windows_status"]).invoke({}) == "closed"
+    assert cache.wrap(read).invoke({}) == {"open": False}
+
+
+def test_released_cache_is_dropped():
+    prefetcher = SpeculativePrefetcher({})
+    prefetcher.start("request-1", "close the windows")
+
+    assert get_prefetch_cache("request-1") is not None
+    release_prefetch_cache("request-1")
+    assert get_prefetch_cache("request-1") is None
@@ -0,0 +1,148 @@
+import asyncio
+import json
+from typing import Any, Dict
+
+from app.api.v2.routes import tasks
+from app.api.v2.routes.tasks import TaskUpdateHub, is_resync_request, subscribe_to_task
+from app.services.progress import ProgressPublisher, get_blackboard_delta
+
+
+def step(step_id: str, status: str = "pending", description: str = "Close all windows") -> dict:
+    return {"id": step_id, "agent": "Window Agent", "description": description, "status": status,
+            "depends_on": [], "condition": None, "tool": None, "args": {}}
+
+
+def apply_blackboard_delta(blackboard: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the blackboard with the delta applied, as frontend/src/hooks/blackboardSync.ts does"""
+    patched = dict(blackboard)
+    for section, changes in delta.items():
+        value = blackboard.get(section)
+        if not isinstance(changes, dict) or not isinstance(value, dict):
+            patched[section] = changes
+            continue
+        value = dict(value)
+        for field, field_changes in changes.items():
+            if isinstance(value.get(field), list) and isinstance(field_changes, dict) and "length" in field_changes:
+                items = value[field][:field_changes["length"]]
+                items += [None] * (field_changes["length"] - len(items))
+                for index, item in field_changes["changed"].items():
+                    items[int(index)] = item
+                value[field] = items
+            else:
+                value[field] = field_changes
+        patched[section] = value
+    return patched
+
+
+BLACKBOARDS = [
+    {"plan": {"steps": [], "status": "pending"}, "history": {"steps": [], "status": "pending"}},
+    # Steps appended
+    {"plan": {"steps": [step("a"), step("b")], "status": "in_progress"}, "history": {"steps": [], "status": "pending"}},
+    # A step updated and history appended
+    {"plan": {"steps": [step("a", "completed"), step("b")], "status": "in_progress"},
+     "history": {"steps": [step("a", "completed", "Closed 3 windows")], "status": "pending"}},
+    # Status only
+    {"plan": {"steps": [step("a", "completed"), step("b")], "status": "completed"},
+     "history": {"steps": [step("a", "completed", "Closed 3 windows")], "status": "pending"}},
+    # Steps removed
+    {"plan": {"steps": [step("b", "completed")], "status": "completed"},
+     "history": {"steps": [step("a", "completed", "Closed 3 windows")], "status": "completed"}},
+]
+
+
+class FakeRedis:
+    """Keys and channels the progress publisher writes to"""
+    def __init__(self):
+        self.values = {}
+        self.published = []
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+
+    def execute(self):
+        pass
+
+    async def get(self, key):
+        return self.values.get(key)
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+
+def publish_all(redis: FakeRedis) -> list:
+    publisher = ProgressPublisher("redis://localhost:6379/0", max_batch=100)
+    publisher.client = redis
+    for blackboard in BLACKBOARDS:
+        publisher.publish_blackboard("t1", {"status": "processing", "agent": "Window Agent"}, blackboard)
+    assert publisher.flush(5)
+    return [json.loads(message) for _, message in redis.published]
+
+
+def test_snapshot_and_deltas_rebuild_every_blackboard():
+    messages = publish_all(FakeRedis())
+
+    assert [message["type"] for message in messages] == ["snapshot"] + ["delta"] * (len(BLACKBOARDS) - 1)
+    assert [message["seq"] for message in messages] == list(range(1, len(BLACKBOARDS) + 1))
+    blackboard = messages[0]["blackboard"]
+    for message, expected in zip(messages[1:], BLACKBOARDS[1:]):
+        blackboard = apply_blackboard_delta(blackboard, message["delta"])
+        assert blackboard == expected
+
+
+def test_delta_only_carries_what_changed():
+    delta = get_blackboard_delta(BLACKBOARDS[2], BLACKBOARDS[3])
+    assert delta == {"plan": {"status": "completed"}}
+
+    delta = get_blackboard_delta(BLACKBOARDS[1], BLACKBOARDS[2])
+    assert delta["plan"] == {"steps": {"changed": {"0": step("a", "completed")}, "length": 2}}
+    assert delta["history"] == {"steps": {"changed": {"0": step("a", "completed", "Closed 3 windows")}, "length": 1}}
+
+    assert get_blackboard_delta(BLACKBOARDS[4], BLACKBOARDS[4]) == {}
+
+
+def test_latest_snapshot_is_stored_for_late_clients():
+    redis = FakeRedis()
+    publish_all(redis)
+
+    snapshot = json.loads(redis.values["task-snapshot:t1"])
+    assert snapshot["type"] == "snapshot"
+    assert snapshot["seq"] == len(BLACKBOARDS)
+    assert snapshot["blackboard"] == BLACKBOARDS[-1]
+
+
+def test_client_is_sent_the_snapshot_on_connect_and_on_resync():
+    redis = FakeRedis()
+    messages = publish_all(redis)
+    websocket = FakeWebSocket()
+
+    async def run():
+        hub = TaskUpdateHub(redis)
+        tasks._task_update_hubs[asyncio.get_running_loop()] = hub
+        queue = asyncio.Queue()
+        subscription = asyncio.create_task(subscribe_to_task("t1", websocket, queue))
+        # The client misses delta 3, gets delta 4 and asks for the current snapshot
+        queue.put_nowait(json.dumps(messages[1]))
+        queue.put_nowait(json.dumps(messages[3]))
+        assert is_resync_request(json.dumps({"type": "resync"}))
+        hub.request_snapshot(queue)
+        while len(websocket.sent) < 4:
+            await asyncio.sleep(0.01)
+        subscription.cancel()
+
+    asyncio.run(asyncio.wait_for(run(), 5))
+
+    assert [(message["type"], message["seq"]) for message in websocket.sent] == [
+        ("snapshot", 5), ("delta", 2), ("delta", 4), ("snapshot", 5),
+    ]
+    assert websocket.sent[-1]["blackboard"] == BLACKBOARDS[-1]
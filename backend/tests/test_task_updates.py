@@ -0,0 +1,84 @@
+import asyncio
+
+from app.api.v2.routes.tasks import SNAPSHOT_REQUEST, TaskUpdateHub
+
+
+class FakePubSub:
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def psubscribe(self, pattern):
+        self.redis.subscriptions += 1
+
+    async def listen(self):
+        # Redis confirms the subscription before it delivers any message
+        await self.redis.confirm.wait()
+        yield {"type": "psubscribe", "pattern": None, "channel": "task:*", "data": 1}
+        while True:
+            message = await self.redis.messages.get()
+            if isinstance(message, Exception):
+                raise message
+            yield message
+
+    async def reset(self):
+        pass
+
+
+class FakeRedis:
+    def __init__(self):
+        self.subscriptions = 0
+        self.confirm = asyncio.Event()
+        self.messages = asyncio.Queue()
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+    def publish(self, task_id, data):
+        self.messages.put_nowait({"type": "pmessage", "pattern": "task:*", "channel": f"task:{task_id}", "data": data})
+
+
+def test_subscribe_returns_once_the_subscription_is_live():
+    async def run():
+        redis = FakeRedis()
+        hub = TaskUpdateHub(redis)
+        subscribing = asyncio.create_task(hub.subscribe("t1"))
+        await asyncio.sleep(0.05)
+        assert not subscribing.done()
+
+        redis.confirm.set()
+        queue = await subscribing
+        redis.publish("t1", "update")
+        assert await asyncio.wait_for(queue.get(), 1) == "update"
+        hub.listener.cancel()
+
+    asyncio.run(run())
+
+
+def test_subscription_outlives_its_clients():
+    async def run():
+        redis = FakeRedis()
+        redis.confirm.set()
+        hub = TaskUpdateHub(redis)
+        hub.unsubscribe("t1", await hub.subscribe("t1"))
+        queue = await hub.subscribe("t1")
+
+        assert redis.subscriptions == 1 and not hub.listener.done()
+        hub.unsubscribe("t1", queue)
+        hub.listener.cancel()
+
+    asyncio.run(run())
+
+
+def test_clients_are_resynced_after_the_subscription_is_lost():
+    async def run():
+        redis = FakeRedis()
+        redis.confirm.set()
+        hub = TaskUpdateHub(redis)
+        queue = await hub.subscribe("t1")
+
+        redis.messages.put_nowait(ConnectionError("connection lost"))
+        assert await asyncio.wait_for(queue.get(), 3) is SNAPSHOT_REQUEST
+        assert redis.subscriptions == 2
+        hub.listener.cancel()
+
+    asyncio.run(run())
@@ -0,0 +1,50 @@
+import threading
+
+from langchain_core.tools import StructuredTool
+
+from app.services.tool_cache import ToolResultCache
+
+WINDOWS = {"open": True}
+READING = threading.Event()
+CLOSED = threading.Event()
+
+
+def get_all_windows_status() -> dict:
+    """Return the status of all windows"""
+    status = dict(WINDOWS)
+    READING.set()
+    # The action runs while this read is in flight
+    CLOSED.wait(timeout=5)
+    return status
+
+
+def close_window() -> str:
+    """Close all windows"""
+    WINDOWS["open"] = False
+    return "closed"
+
+
+def test_read_overlapping_an_action_is_not_cached():
+    cache = ToolResultCache(max_entries=16)
+    read = cache.wrap(StructuredTool.from_function(get_all_windows_status), ttl=60)
+    action = cache.wrap(StructuredTool.from_function(close_window), invalidates=["get_all_windows_status"])
+
+    results = []
+    reader = threading.Thread(target=lambda: results.append(read.invoke({})))
+    reader.start()
+    READING.wait(timeout=5)
+    action.invoke({})
+    CLOSED.set()
+    reader.join(timeout=5)
+
+    assert results == [{"open": True}]
+    assert cache.get("get_all_windows_status", {}) == (False, None)
+
+
+def test_read_is_cached_until_an_action_invalidates_it():
+    cache = ToolResultCache(max_entries=16)
+    cache.set("get_all_windows_status", {}, {"open": True}, ttl=60, generation=cache.get_generation("get_all_windows_status"))
+    assert cache.get("get_all_windows_status", {}) == (True, {"open": True})
+
+    cache.invalidate(["get_all_windows_status"])
+    assert cache.get("get_all_windows_status", {}) == (False, None)
@@ -43,6 +43,8 @@ const ChatBox = forwardRef<ChatBoxRef, ChatBoxProps>(({
 }, ref) => {
   const [input, setInput] = useState("");
   const [steps, setSteps] = useState<Step[]>([]);
+  // Final summary while it is being streamed, replaced by the completed message
+  const [streamingSummary, setStreamingSummary] = useState<string | null>(null);
   const [activeTab, setActiveTab] = useState<TabType>("chat");
   
   const messagesEndRef = useRef<HTMLDivElement>(null);
@@ -87,8 +89,14 @@ const ChatBox = forwardRef<ChatBoxRef, ChatBoxProps>(({
         setTimeout(() => scrollToBottom(stepsEndRef), 100);
       }
 
+      if (lastMessage.status === "streaming" && lastMessage.summary) {
+        setStreamingSummary(lastMessage.summary);
+        setTimeout(() => scrollToBottom(messagesEndRef), 100);
+      }
+
       // Only add messages that are completed or error
       if (lastMessage.status === "completed" || lastMessage.status === "error") {
+        setStreamingSummary(null);
         addMessage({
           text: formatMessage(lastMessage),
           sender: "system",
@@ -176,6 +184,11 @@ const ChatBox = forwardRef<ChatBoxRef, ChatBoxProps>(({
               {msg.text}
             </div>
           ))}
+          {streamingSummary && (
+            <div className="chat-message system-msg processing">
+              {streamingSummary}
+            </div>
+          )}
           <div ref={messagesEndRef} />
         </div>
         <div className="chatbox-input">
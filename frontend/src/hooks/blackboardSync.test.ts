@@ -0,0 +1,95 @@
+import { Blackboard, applyDelta, initialSync, receiveUpdate } from './blackboardSync';
+
+const step = (id: string, status = 'pending', description = 'Close all windows') => ({
+  id, agent: 'Window Agent', description, status, depends_on: [], condition: null, tool: null, args: {},
+});
+
+const blackboards: Blackboard[] = [
+  { plan: { steps: [], status: 'pending' }, history: { steps: [], status: 'pending' } },
+  // Steps appended
+  { plan: { steps: [step('a'), step('b')], status: 'in_progress' }, history: { steps: [], status: 'pending' } },
+  // A step updated and history appended
+  {
+    plan: { steps: [step('a', 'completed'), step('b')], status: 'in_progress' },
+    history: { steps: [step('a', 'completed', 'Closed 3 windows')], status: 'pending' },
+  },
+  // Status only
+  {
+    plan: { steps: [step('a', 'completed'), step('b')], status: 'completed' },
+    history: { steps: [step('a', 'completed', 'Closed 3 windows')], status: 'pending' },
+  },
+  // Steps removed
+  {
+    plan: { steps: [step('b', 'completed')], status: 'completed' },
+    history: { steps: [step('a', 'completed', 'Closed 3 windows')], status: 'completed' },
+  },
+];
+
+// Deltas as app/services/progress.py get_blackboard_delta builds them
+const deltas: Blackboard[] = [
+  { plan: { steps: { changed: { 0: step('a'), 1: step('b') }, length: 2 }, status: 'in_progress' } },
+  {
+    plan: { steps: { changed: { 0: step('a', 'completed') }, length: 2 } },
+    history: { steps: { changed: { 0: step('a', 'completed', 'Closed 3 windows') }, length: 1 } },
+  },
+  { plan: { status: 'completed' } },
+  { plan: { steps: { changed: { 0: step('b', 'completed') }, length: 1 } }, history: { status: 'completed' } },
+];
+
+const snapshot = (seq: number) => ({ type: 'snapshot', seq, status: 'processing', blackboard: blackboards[seq - 1] });
+const delta = (seq: number) => ({ type: 'delta', seq, status: 'processing', delta: deltas[seq - 2] });
+
+test('applies each delta on the previous blackboard', () => {
+  let blackboard = blackboards[0];
+  deltas.forEach((changes, index) => {
+    blackboard = applyDelta(blackboard, changes);
+    expect(blackboard).toEqual(blackboards[index + 1]);
+  });
+});
+
+test('rebuilds every blackboard from the snapshot and the deltas', () => {
+  let result = receiveUpdate(initialSync, snapshot(1));
+  expect(result.message).toEqual(snapshot(1));
+  for (let seq = 2; seq <= blackboards.length; seq++) {
+    result = receiveUpdate(result.sync, delta(seq));
+    expect(result.resync).toBe(false);
+    expect(result.message).toEqual({ type: 'delta', seq, status: 'processing', blackboard: blackboards[seq - 1] });
+  }
+  expect(result.sync.seq).toBe(blackboards.length);
+});
+
+test('ignores deltas and snapshots it is already past', () => {
+  let result = receiveUpdate(initialSync, snapshot(3));
+  result = receiveUpdate(result.sync, delta(3));
+  expect(result.message).toBeNull();
+  result = receiveUpdate(result.sync, snapshot(2));
+  expect(result.message).toBeNull();
+  expect(result.sync.blackboard).toEqual(blackboards[2]);
+});
+
+test('asks for a snapshot once after a missed delta and recovers from it', () => {
+  let result = receiveUpdate(initialSync, snapshot(1));
+  result = receiveUpdate(result.sync, delta(2));
+
+  // Delta 3 is missed
+  result = receiveUpdate(result.sync, delta(4));
+  expect(result).toEqual({ sync: { ...result.sync, seq: 2, resyncing: true }, message: null, resync: true });
+  result = receiveUpdate(result.sync, delta(5));
+  expect(result.message).toBeNull();
+  expect(result.resync).toBe(false);
+
+  result = receiveUpdate(result.sync, snapshot(5));
+  expect(result.message).toEqual(snapshot(5));
+  expect(result.sync).toEqual({ seq: 5, blackboard: blackboards[4], resyncing: false });
+});
+
+test('asks for a snapshot when a delta arrives before any snapshot', () => {
+  const result = receiveUpdate(initialSync, delta(2));
+  expect(result.resync).toBe(true);
+  expect(result.message).toBeNull();
+});
+
+test('passes other messages through', () => {
+  const message = { status: 'streaming', content: 'Closing' };
+  expect(receiveUpdate(initialSync, message)).toEqual({ sync: initialSync, message, resync: false });
+});
@@ -0,0 +1,79 @@
+export type Blackboard = Record<string, any>;
+
+// Blackboard rebuilt from the snapshot and the deltas, with the sequence number of the last one applied
+export interface BlackboardSync {
+  seq: number;
+  blackboard: Blackboard | null;
+  resyncing: boolean;
+}
+
+export interface SyncResult {
+  sync: BlackboardSync;
+  // Message to show, null when the update is dropped
+  message: Record<string, any> | null;
+  // Whether to ask the server for the current snapshot
+  resync: boolean;
+}
+
+export const initialSync: BlackboardSync = { seq: 0, blackboard: null, resyncing: false };
+
+const isObject = (value: any): value is Record<string, any> =>
+  typeof value === 'object' && value !== null && !Array.isArray(value);
+
+// Applies the changed fields of each section, step lists arrive as their changed steps by index and new length
+export const applyDelta = (blackboard: Blackboard, delta: Blackboard): Blackboard => {
+  const next: Blackboard = { ...blackboard };
+  for (const [section, changes] of Object.entries(delta)) {
+    const current = blackboard[section];
+    if (!isObject(changes) || !isObject(current)) {
+      next[section] = changes;
+      continue;
+    }
+    const updated: Record<string, any> = { ...current };
+    for (const [field, value] of Object.entries(changes)) {
+      if (Array.isArray(current[field]) && isObject(value) && 'length' in value) {
+        const items = current[field].slice(0, value.length);
+        for (const [index, item] of Object.entries(value.changed ?? {})) {
+          items[Number(index)] = item;
+        }
+        updated[field] = items;
+      } else {
+        updated[field] = value;
+      }
+    }
+    next[section] = updated;
+  }
+  return next;
+};
+
+// Applies a snapshot or delta message, other messages are passed through as they are
+export const receiveUpdate = (sync: BlackboardSync, data: Record<string, any>): SyncResult => {
+  if (data.type === 'snapshot') {
+    // A snapshot read before the last delta applied is already outdated
+    if (sync.blackboard && data.seq < sync.seq) {
+      return { sync: { ...sync, resyncing: false }, message: null, resync: false };
+    }
+    return {
+      sync: { seq: data.seq, blackboard: data.blackboard, resyncing: false },
+      message: data,
+      resync: false,
+    };
+  }
+  if (data.type === 'delta') {
+    if (sync.blackboard && data.seq <= sync.seq) {
+      return { sync, message: null, resync: false };
+    }
+    // A missed update cannot be applied on, ask for the current snapshot once instead
+    if (!sync.blackboard || data.seq !== sync.seq + 1) {
+      return { sync: { ...sync, resyncing: true }, message: null, resync: !sync.resyncing };
+    }
+    const { delta, ...message } = data;
+    const blackboard = applyDelta(sync.blackboard, delta);
+    return {
+      sync: { seq: data.seq, blackboard, resyncing: false },
+      message: { ...message, blackboard },
+      resync: false,
+    };
+  }
+  return { sync, message: data, resync: false };
+};
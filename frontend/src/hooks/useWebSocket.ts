@@ -1,7 +1,8 @@
 import { useState, useEffect, useRef, useCallback } from 'react';
+import { BlackboardSync, initialSync, receiveUpdate } from './blackboardSync';
 
 interface WebSocketMessage {
-  status?: 'processing' | 'completed' | 'error';
+  status?: 'processing' | 'streaming' | 'completed' | 'error';
   [key: string]: any;
 }
 
@@ -17,6 +18,7 @@ export const useWebSocket = (): UseWebSocketReturn => {
   const [isConnected, setIsConnected] = useState(false);
   const [lastMessage, setLastMessage] = useState<WebSocketMessage | null>(null);
   const wsRef = useRef<WebSocket | null>(null);
+  const syncRef = useRef<BlackboardSync>(initialSync);
 
   const connect = useCallback((taskId: string) => {
     // Close existing connection if any
@@ -25,7 +27,8 @@ export const useWebSocket = (): UseWebSocketReturn => {
     }
 
     const wsUrl = `ws://localhost:5172/api/v2/async/ws/task/${taskId}`;
-    
+    syncRef.current = initialSync;
+
     try {
       const ws = new WebSocket(wsUrl);
       wsRef.current = ws;
@@ -37,7 +40,14 @@ export const useWebSocket = (): UseWebSocketReturn => {
       ws.onmessage = (event: MessageEvent) => {
         try {
           const data = JSON.parse(event.data);
-          setLastMessage(data);
+          const { sync, message, resync } = receiveUpdate(syncRef.current, data);
+          syncRef.current = sync;
+          if (resync) {
+            ws.send(JSON.stringify({ type: 'resync' }));
+          }
+          if (message) {
+            setLastMessage(message);
+          }
         } catch (error) {
           console.error('Failed to parse WebSocket message:', error);
         }